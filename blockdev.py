@@ -0,0 +1,283 @@
+""" Block device topology index built from sysfs and mountinfo
+
+Mountpoints are mapped to their block device and through partitions,
+device mapper (LVM, LUKS) and md RAID layers down to physical disks. Index
+is rebuilt only after kernel reports change of mount table.
+"""
+import logging
+import os
+import re
+import select
+import threading
+from typing import Optional
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_SYS = "/sys"
+DEFAULT_MOUNTINFO = "/proc/self/mountinfo"
+
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def _unescape(text: str) -> str:
+    # Spaces, tabs, newlines and backslashes are octal escaped in mountinfo
+    return _ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), text)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def parse_mountinfo(text: str) -> list:
+    """parse_mountinfo Function to parse /proc/<pid>/mountinfo content
+
+    Args:
+        text (str): mountinfo content
+
+    Returns:
+        list: dicts with mountpoint, devno ("major:minor"), fstype and source
+    """
+    ret = []
+
+    for line in text.splitlines():
+        fields = line.split(" ")
+        # Optional fields end with "-" separator, its position varies
+        if len(fields) < 10 or "-" not in fields[6:]:
+            continue
+        separator = fields.index("-", 6)
+
+        ret.append({
+            "mountpoint": _unescape(fields[4]),
+            "devno": fields[2],
+            "fstype": fields[separator + 1],
+            "source": _unescape(fields[separator + 2]),
+        })
+
+    return ret
+
+
+class BlockIndex:
+    """BlockIndex Mountpoint to block device and physical disk lookup table
+
+    Args:
+        sys_root (str): sysfs mount, fixture directory can be used in tests
+        mountinfo (str): mountinfo file
+    """
+
+    def __init__(self, sys_root: str = DEFAULT_SYS, mountinfo: str = DEFAULT_MOUNTINFO):
+        self.sys_root = sys_root
+        self.mountinfo = mountinfo
+        self._fd = None
+        self._poll = None
+        self._mounts = None
+        self._devices = dict()
+        self._lock = threading.Lock()
+
+    def _read_mountinfo(self) -> str:
+        if self._fd is None:
+            self._fd = os.open(self.mountinfo, os.O_RDONLY)
+            self._poll = select.poll()
+            self._poll.register(self._fd, select.POLLPRI | select.POLLERR)
+
+        # Reading whole file through watched descriptor acknowledges pending change
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        return b"".join(chunks).decode("utf-8", "replace")
+
+    def _changed(self) -> bool:
+        if self._poll is None:
+            return True
+        # Kernel reports each mount table change once, poll consumes it
+        return any(events & (select.POLLPRI | select.POLLERR) for _, events in self._poll.poll(0))
+
+    def _scan_devices(self) -> dict:
+        """_scan_devices Function to read every block device with its parents from sysfs
+
+        Returns:
+            dict: name -> {name, devno, model, label, parents}
+        """
+        ret = dict()
+        class_dir = os.path.join(self.sys_root, "class", "block")
+
+        try:
+            names = os.listdir(class_dir)
+        except OSError as err:
+            logger.error("Cannot list %s: %s", class_dir, err)
+            return ret
+
+        for name in names:
+            path = os.path.realpath(os.path.join(class_dir, name))
+
+            if os.path.exists(os.path.join(path, "partition")):
+                parents = [os.path.basename(os.path.dirname(path))]
+            else:
+                try:
+                    parents = sorted(os.listdir(os.path.join(path, "slaves")))
+                except OSError:
+                    parents = []
+
+            ret[name] = {
+                "name": name,
+                "devno": _read(os.path.join(path, "dev")),
+                "model": _read(os.path.join(path, "device", "model")) or None,
+                "label": _read(os.path.join(path, "dm", "name")) or _read(os.path.join(path, "md", "level")),
+                "parents": parents,
+            }
+
+        return ret
+
+    def _disks(self, name: str, seen: set = None) -> list:
+        """_disks Function to walk parents of device down to physical disks
+
+        Args:
+            name (str): device name
+            seen (set): devices already visited, guards against cycles
+
+        Returns:
+            list: names of devices without parents, RAID members in order
+        """
+        seen = set() if seen is None else seen
+
+        if name in seen or name not in self._devices:
+            return []
+        seen.add(name)
+
+        parents = self._devices[name]["parents"]
+
+        if not parents:
+            return [name]
+
+        ret = []
+        for parent in parents:
+            for disk in self._disks(parent, seen):
+                if disk not in ret:
+                    ret.append(disk)
+
+        return ret
+
+    def _resolve(self, mount: dict, by_devno: dict) -> Optional[str]:
+        name = by_devno.get(mount["devno"])
+        if name is not None:
+            return name
+
+        # Btrfs and some other filesystems report anonymous device numbers
+        if mount["source"].startswith("/dev/"):
+            name = os.path.basename(os.path.realpath(mount["source"]))
+            if name in self._devices:
+                return name
+
+        return None
+
+    def rebuild(self) -> None:
+        """rebuild Function to read sysfs and mount table again
+        """
+        with self._lock:
+            self._build()
+
+    def _build(self) -> None:
+        try:
+            mounts = parse_mountinfo(self._read_mountinfo())
+        except OSError as err:
+            logger.error("Cannot read %s: %s", self.mountinfo, err)
+            mounts = []
+
+        self._devices = self._scan_devices()
+        by_devno = {device["devno"]: name for name, device in self._devices.items() if device["devno"]}
+        index = dict()
+
+        for mount in mounts:
+            name = self._resolve(mount, by_devno)
+            if name is None:
+                continue
+
+            # Later entries are mounted over earlier ones on same mountpoint
+            index[mount["mountpoint"]] = {
+                "mountpoint": mount["mountpoint"],
+                "device": name,
+                "label": self._devices[name]["label"],
+                "fstype": mount["fstype"],
+                "source": mount["source"],
+                "disks": [{"name": disk, "model": self._devices[disk]["model"]} for disk in self._disks(name)],
+            }
+
+        self._mounts = index
+        logger.debug("Block index: %s mounts, %s devices", len(index), len(self._devices))
+
+    def _table(self) -> dict:
+        with self._lock:
+            if self._mounts is None or self._changed():
+                self._build()
+            return self._mounts
+
+    def lookup(self, mountpoint: str) -> Optional[dict]:
+        """lookup Function to get block device behind mountpoint
+
+        Args:
+            mountpoint (str): mountpoint, e.g. "/"
+
+        Returns:
+            dict: mountpoint, device, label, fstype, source and disks with name and model,
+                None if mountpoint is not backed by block device
+        """
+        return self._table().get(mountpoint)
+
+    def mounts(self) -> list:
+        """mounts Function to get every mount backed by block device
+
+        Returns:
+            list: lookup dicts sorted by mountpoint
+        """
+        index = self._table()
+        return [index[mountpoint] for mountpoint in sorted(index)]
+
+    def disk_name(self, mountpoint: str) -> str:
+        """disk_name Function to get model of disk holding mountpoint, device name if model is unknown
+
+        Args:
+            mountpoint (str): mountpoint
+
+        Returns:
+            str: disk models or names joined with "+" for RAID, empty if mountpoint is unknown
+        """
+        entry = self.lookup(mountpoint)
+
+        if entry is None:
+            return ""
+
+        return "+".join(disk["model"] or disk["name"] for disk in entry["disks"])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = None
+            self._poll = None
+            self._mounts = None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> BlockIndex:
+    """get_index Function to get shared index of running system
+
+    Returns:
+        BlockIndex: index
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = BlockIndex()
+        return _index
@@ -0,0 +1,140 @@
+""" Bulk container operations with selectors, ordering groups and bounded parallelism
+
+Selector syntax: plain container name, glob pattern (web-*) or label
+selector (label:tier or label:tier=front).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from time import monotonic
+from typing import Callable
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_CONCURRENCY = 4
+LABEL_PREFIX = "label:"
+_GLOB_CHARS = "*?["
+
+
+def parse_selectors(text: str) -> list:
+    """parse_selectors Function to split comma separated selector list
+
+    Args:
+        text (str): selectors, e.g. "db,web-*,label:tier=front"
+
+    Returns:
+        list: selectors
+    """
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def needs_listing(selectors: list) -> bool:
+    """needs_listing Function to check if selectors can only be resolved against container list
+
+    Args:
+        selectors (list): selectors
+
+    Returns:
+        bool: True if any selector is glob or label selector
+    """
+    return any(selector.startswith(LABEL_PREFIX) or any(char in selector for char in _GLOB_CHARS)
+               for selector in selectors)
+
+
+def _matches(selector: str, container: dict) -> bool:
+    if selector.startswith(LABEL_PREFIX):
+        key, _, value = selector[len(LABEL_PREFIX):].partition("=")
+        labels = container.get("labels", {})
+        return key in labels and (not value or labels[key] == value)
+
+    return fnmatchcase(container["name"], selector)
+
+
+def select(selectors: list, containers: list = None) -> tuple[list, list]:
+    """select Function to resolve selectors to container names
+
+    Args:
+        selectors (list): selectors
+        containers (list, optional): dicts with "name" and "labels", required for globs and labels
+
+    Returns:
+        tuple[list, list]: matched names in selector order, selectors that matched nothing
+    """
+    names = []
+    unmatched = []
+
+    for selector in selectors:
+        if containers is None:
+            matched = [selector]
+        else:
+            matched = sorted(container["name"] for container in containers if _matches(selector, container))
+
+        if not matched:
+            unmatched.append(selector)
+
+        for name in matched:
+            if name not in names:
+                names.append(name)
+
+    return names, unmatched
+
+
+def run_groups(action: str, groups: list, func: Callable, concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """run_groups Function to run operation on containers group after group
+
+    Containers inside group run in parallel with at most concurrency
+    operations at once, next group starts when previous one finished.
+    Container present in several groups runs only in first one.
+
+    Args:
+        action (str): operation name reported in result
+        groups (list): lists of container names
+        func (Callable): operation taking container name, returns (ok, error)
+        concurrency (int): max parallel operations
+
+    Returns:
+        dict: action, ok, duration and per container results with group, ok, duration and error
+    """
+    start = monotonic()
+    results = []
+    seen = set()
+
+    def timed(name: str) -> tuple:
+        begin = monotonic()
+        try:
+            ok, error = func(name)
+        except Exception as err:
+            ok, error = False, str(err)
+        return ok, error, round(monotonic() - begin, 3)
+
+    for index, group in enumerate(groups):
+        names = [name for name in group if name not in seen]
+        seen.update(names)
+
+        if not names:
+            continue
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(names)))) as executor:
+            futures = [(name, executor.submit(timed, name)) for name in names]
+
+            for name, future in futures:
+                ok, error, duration = future.result()
+                results.append({
+                    "name": name,
+                    "group": index,
+                    "ok": ok,
+                    "duration": duration,
+                    "error": error,
+                })
+
+    ret = {
+        "action": action,
+        "ok": all(result["ok"] for result in results),
+        "duration": round(monotonic() - start, 3),
+        "items": len(results),
+        "results": results,
+    }
+
+    logger.debug("Bulk %s: %s", action, ret)
+
+    return ret
@@ -0,0 +1,132 @@
+""" TTL cache for static and slow changing system facts
+"""
+import functools
+import logging
+import threading
+from time import monotonic
+from typing import Callable, Optional
+
+logger = logging.getLogger('copilotLogger')
+
+FOREVER = None
+
+
+class TTLCache:
+    """TTLCache Key value cache with per key expiry and hit/miss counters
+
+    None results are never stored so failed lookups are retried next call.
+    """
+
+    def __init__(self):
+        self._entries = dict()
+        self._counters = dict()
+        self._hooks = dict()
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, field: str) -> None:
+        counters = self._counters.setdefault(key, {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def get(self, key: str, func: Callable, ttl: Optional[float] = FOREVER):
+        """get Function to get cached value, func is called on miss
+
+        Args:
+            key (str): cache key
+            func (Callable): value source called without arguments
+            ttl (float, optional): seconds value stays valid, None keeps it until invalidated
+
+        Returns:
+            Any: cached or fresh value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and (entry[0] is None or entry[0] > monotonic()):
+                self._count(key, "hits")
+                return entry[1]
+
+            self._count(key, "misses")
+
+        value = func()
+
+        if value is not None:
+            expires = None if ttl is None else monotonic() + ttl
+            with self._lock:
+                self._entries[key] = (expires, value)
+
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        """invalidate Function to drop keys and every key derived from them
+
+        Args:
+            keys (str): cache keys, "name" also drops "name:<args>" entries
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if key in keys or key.split(":", 1)[0] in keys:
+                    del self._entries[key]
+
+        for key in keys:
+            for hook in self._hooks.get(key, ()):
+                hook()
+
+        logger.debug("Cache invalidated: %s", keys)
+
+    def invalidate_all(self) -> None:
+        """invalidate_all Function to drop every cached value
+        """
+        with self._lock:
+            keys = list(self._entries)
+        self.invalidate(*{key.split(":", 1)[0] for key in keys})
+
+    def on_invalidate(self, key: str, hook: Callable) -> None:
+        """on_invalidate Function to register callback run when key is invalidated
+
+        Args:
+            key (str): cache key
+            hook (Callable): callback without arguments
+        """
+        self._hooks.setdefault(key, []).append(hook)
+
+    def stats(self) -> dict:
+        """stats Function to get hit and miss counters
+
+        Returns:
+            dict: key -> {hits, misses}, totals under "total"
+        """
+        with self._lock:
+            ret = {key: dict(counters) for key, counters in self._counters.items()}
+
+        ret["total"] = {
+            "hits": sum(counters["hits"] for counters in ret.values()),
+            "misses": sum(counters["misses"] for counters in ret.values()),
+        }
+
+        return ret
+
+
+cache = TTLCache()
+
+
+def cached(key: str, ttl: Optional[float] = FOREVER) -> Callable:
+    """cached Decorator storing function result in shared cache
+
+    Calls with arguments are stored under "key:<args>".
+
+    Args:
+        key (str): cache key
+        ttl (float, optional): seconds value stays valid, None keeps it until invalidated
+
+    Returns:
+        Callable: decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            full_key = key
+            if args or kwargs:
+                full_key = f"{key}:{args}{sorted(kwargs.items()) if kwargs else ''}"
+            return cache.get(full_key, lambda: func(*args, **kwargs), ttl)
+        return wrapper
+    return decorator
@@ -0,0 +1,64 @@
+""" Thin client for copilot daemon
+
+Kept free of psutil and logging configuration so a query costs only a socket
+round trip.
+"""
+import json
+import os
+import socket
+from typing import Optional
+
+DEFAULT_SOCKET = os.environ.get("COPILOT_SOCKET", f"/tmp/copilot-{os.getuid()}.sock")
+# Commands daemon answers, others always run in calling process
+SERVED_COMMANDS = ("dash", "docker", "update", "stats", "procs", "history", "packages", "disks", "net", "sensors", "thermal")
+
+
+class DaemonError(Exception):
+    """DaemonError Daemon answered with an error
+    """
+
+
+def is_available(socket_path: str = DEFAULT_SOCKET) -> bool:
+    """is_available Function to check if daemon socket exists
+
+    Args:
+        socket_path (str): daemon socket path
+
+    Returns:
+        bool: True if socket file exists
+    """
+    return os.path.exists(socket_path)
+
+
+def query(request: dict, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = None):
+    """query Function to send one request to daemon and wait for its answer
+
+    Args:
+        request (dict): request, see daemon.handle_request
+        socket_path (str): daemon socket path
+        timeout (float, optional): socket timeout in seconds
+
+    Raises:
+        OSError: daemon is not reachable
+        DaemonError: daemon failed to handle request
+
+    Returns:
+        Any: request result
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        with sock.makefile("rb") as stream:
+            line = stream.readline()
+
+    if not line:
+        raise ConnectionError("Daemon closed connection without answer")
+
+    response = json.loads(line)
+
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", "unknown error"))
+
+    return response.get("result")
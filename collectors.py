@@ -0,0 +1,106 @@
+""" Collector engine running probes concurrently under a latency budget
+"""
+import logging
+import threading
+from time import monotonic
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_PROBE_TIMEOUT = 1.0
+DEFAULT_BUDGET = 1.2
+
+_last_values = dict()
+_inflight = set()
+_lock = threading.Condition()
+
+
+class Probe(NamedTuple):
+    """Probe Named value source with its own timeout
+    """
+    name: str
+    func: Callable
+    timeout: float = DEFAULT_PROBE_TIMEOUT
+    args: tuple = ()
+
+
+def _run_probe(probe: Probe, results: dict) -> None:
+    start = monotonic()
+    ok = True
+    value = None
+
+    try:
+        value = probe.func(*probe.args)
+    except Exception as err:
+        ok = False
+        logger.error("Probe %s failed: %s", probe.name, err)
+
+    logger.debug("Probe %s took %.3f s", probe.name, monotonic() - start)
+
+    with _lock:
+        _inflight.discard(probe.name)
+        if ok:
+            # Late results still refresh the last known value for next collection
+            _last_values[probe.name] = value
+        results[probe.name] = (ok, value)
+        _lock.notify_all()
+
+
+def collect(probes: list, budget: float = DEFAULT_BUDGET) -> tuple[dict, list, list]:
+    """collect Function to run probes in parallel and gather what finished in time
+
+    Probes still running when their timeout or the overall budget passes are
+    left in background, their last known value is returned and marked stale.
+    A probe that is still running from previous collection is not started again.
+
+    Args:
+        probes (list): list of Probe
+        budget (float): total seconds the call may take
+
+    Returns:
+        tuple[dict, list, list]: values by probe name, stale names, missing names
+    """
+    start = monotonic()
+    results = dict()
+    deadlines = dict()
+
+    with _lock:
+        for probe in probes:
+            deadlines[probe.name] = start + min(probe.timeout, budget)
+
+            if probe.name in _inflight:
+                logger.warning("Probe %s still running from previous collection", probe.name)
+                deadlines[probe.name] = start
+                continue
+
+            _inflight.add(probe.name)
+            threading.Thread(target=_run_probe, args=(probe, results),
+                             name=f"probe-{probe.name}", daemon=True).start()
+
+        while True:
+            now = monotonic()
+            pending = [deadlines[probe.name] for probe in probes
+                       if probe.name not in results and deadlines[probe.name] > now]
+            if not pending:
+                break
+            _lock.wait(min(pending) - now)
+
+        values = dict()
+        stale = []
+        missing = []
+
+        for probe in probes:
+            ok, value = results.get(probe.name, (False, None))
+
+            if ok:
+                values[probe.name] = value
+            elif probe.name in _last_values:
+                values[probe.name] = _last_values[probe.name]
+                stale.append(probe.name)
+            else:
+                missing.append(probe.name)
+
+    if stale or missing:
+        logger.warning("Collection after %.3f s, stale: %s, missing: %s", monotonic() - start, stale, missing)
+
+    return values, stale, missing
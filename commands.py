@@ -1,21 +1,40 @@
 """ Basic commands for operation
 """
 import logging
-import logging.config
 from os.path import exists as os_exists
-from os import path
-from time import time
+from time import monotonic, time
 import datetime as dt
 import psutil
 from psutil._common import bytes2human
 from shlex import split as xsplit
-import subprocess as sproc
-import json
+from typing import Iterator
+import runner
+import providers
+import procrank
+import dockerapi
+import statsfeed
+import bulk
+import tsdb
+from exporter import Family
+import updates
+import dpkg
+import blockdev
+import publicip
+import sensors
+from cache import cache, cached
+from collectors import Probe, collect
+from sampler import get_cpu_sampler, get_disk_io_sampler, get_net_io_sampler, get_tcp_state_sampler, \
+    get_thermal_sampler
 
-log_file_path = path.join(path.dirname(path.abspath(__file__)), 'log.conf')
-logging.config.fileConfig(log_file_path, disable_existing_loggers=True)
 logger = logging.getLogger('copilotLogger')
 
+APT_UPGRADE_TIMEOUT = 3600
+DOCKER_TIMEOUT = 60
+DASHBOARD_BUDGET = 1.2
+HOSTNAME_TTL = 300
+# Read-only images, always reported as full
+DISK_SKIP_FSTYPES = ("squashfs", "iso9660", "udf")
+
 def get_date() -> dt.datetime:
     """get_date Function to get system date
 
@@ -44,6 +63,10 @@ def get_datetime() -> dt.datetime:
     logger.debug(ret)
     return ret
 
+@cached("boot_time")
+def _get_boot_time() -> float:
+    return psutil.boot_time()
+
 def get_uptime(since: bool) -> str:
     """get_uptime Function to get system uptime
 
@@ -53,17 +76,23 @@ def get_uptime(since: bool) -> str:
     Returns:
         str: Uptime
     """
-    boot_time = psutil.boot_time()
+    boot_time = _get_boot_time()
     ret = ""
 
     if since:
-        ret = dt.datetime.fromtimestamp(boot_time).strftime("%d/%m/%Y %H:%M:%S")
+        ret = _format_boot_time(boot_time)
     else:
-        ret = str(dt.timedelta(seconds=time() - boot_time)).split(".")[0]
+        ret = _format_uptime(time() - boot_time)
 
     logger.debug(ret)
     return ret
 
+def _format_boot_time(boot_time: float) -> str:
+    return dt.datetime.fromtimestamp(boot_time).strftime("%d/%m/%Y %H:%M:%S")
+
+def _format_uptime(seconds: float) -> str:
+    return str(dt.timedelta(seconds=seconds)).split(".")[0]
+
 def get_ram_total() -> float:
     """get_ram_total Function te get total ram in system
 
@@ -142,20 +171,31 @@ def get_swap_available() -> float:
     logger.debug("Available swap: %s GiB", ret)
     return ret
 
-def get_swap_stats() -> dict:
-    
+def get_swap_stats(raw: bool = False) -> dict:
+    """get_swap_stats Function to get swap usage
+
+    Args:
+        raw (bool): sizes in bytes instead of human readable strings
+
+    Returns:
+        dict: total, used, free and percent
+    """
     ret = dict()
-    
-    swap =      psutil.swap_memory()
-    ret["total"] = bytes2human(swap.total)
-    ret["used"] = bytes2human(swap.used)
-    ret["free"] = bytes2human(swap.free)
+
+    swap = psutil.swap_memory()
+    ret["total"] = swap.total
+    ret["used"] = swap.used
+    ret["free"] = swap.free
     ret["percent"] = swap.percent
 
+    if not raw:
+        ret = _humanize_sizes(ret)
+
     logger.debug("Swap stats: %s", ret)
 
     return ret
 
+@cached("cpu_cores")
 def get_cpu_cores() -> int:
     """get_cpu_cores Function to get cpu physical core count
 
@@ -168,6 +208,7 @@ def get_cpu_cores() -> int:
 
     return ret
 
+@cached("cpu_threads")
 def get_cpu_threads() -> int:
     """get_cpu_threads Function to get cpu logical core count
 
@@ -180,6 +221,7 @@ def get_cpu_threads() -> int:
 
     return ret
 
+@cached("cpu_max_freq")
 def get_cpu_max_freq() -> float:
     """get_cpu_max_freq Function to get cpu max frequency
 
@@ -192,6 +234,7 @@ def get_cpu_max_freq() -> float:
 
     return ret
 
+@cached("cpu_min_freq")
 def get_cpu_min_freq() -> float:
     """get_cpu_min_freq Function to get cpu min frequency
 
@@ -225,13 +268,36 @@ def get_cpu_freq(percore: bool) -> list:
 
     return ret
 
-def get_cpu_usage() -> float:
-    ret = psutil.cpu_percent(interval = 1)
+def get_cpu_usage(window: float = 1.0, percore: bool = False) -> float:
+    """get_cpu_usage Function to get cpu utilisation from background sampler
 
-    logger.debug("CPU usage: %s %", ret)
+    Args:
+        window (float): seconds to average over, up to sampler history
+        percore (bool): get utilisation per cpu core
+
+    Returns:
+        float: cpu usage percent, list of percents if percore is set
+    """
+    ret = get_cpu_sampler().usage(window, percore)
+
+    logger.debug("CPU usage: %s %%", ret)
 
     return ret
 
+def get_thermal(window: float = 60.0, since: float = None) -> dict:
+    """get_thermal Function to get frequency and temperature history with throttling episodes
+
+    Args:
+        window (float): seconds of history to aggregate
+        since (float, optional): unix time, only episodes ending after it
+
+    Returns:
+        dict: summary of per cpu frequency and temperatures, episodes list
+    """
+    thermal = get_thermal_sampler()
+
+    return {"summary": thermal.summary(window), "episodes": thermal.episodes(since)}
+
 def get_system_load(percent: bool = False) -> tuple[float, float, float]:
     """get_system_load Function to get system average load over 1 minute, 5 minutes and 15 minutes
 
@@ -260,83 +326,37 @@ def get_cpu_temp(percore: bool = False) -> dict:
         percore (bool): Read cpu temperature per core
 
     Returns:
-        list: cpu temperature list, consist of pairs (str, float)
+        dict: "package" and "core" temperatures, averages unless percore is set
     """
     ret = dict()
-    package_temp = []
-    core_temp = []
-    out = psutil.sensors_temperatures()    
-    keys = out.keys()
-    
-    if len(keys) < 1:
-        return ret
-    
-    is_valid_key = False
-    
-    for key in keys:
-        if (key.lower().find("cpu") != -1) or (key.lower().find("core") != -1) or (key.lower().find("cpu_thermal") != -1) or (key.lower().find("k10temp") != -1) :
-            is_valid_key = True
-            break
-    
-    if not is_valid_key:
-        return ret
-
-    for sensor in out[key]:
-        if sensor.label.lower().find("package") != -1:
-            package_temp.append(round(sensor.current, 1))
-        
-        elif sensor.label.lower().find("core") != -1:
-            core_temp.append(round(sensor.current, 1))
+    temps = sensors.get_registry().cpu()
 
-        elif sensor.label.lower().find("k10temp") != -1:
-            core_temp.append(round(sensor.current, 1))
-            
+    for role in (sensors.PACKAGE, sensors.CORE):
+        values = temps.get(role)
+        if not values:
+            continue
 
-    if len(package_temp) == 0 and len(core_temp) == 0:
-        for sensor in out[key]:
-            core_temp.append(round(sensor.current, 1))
+        if percore:
+            ret[role] = values
+        else:
+            ret[role] = round(sum(values) / len(values), 1)
 
-    if percore:
-        if len(package_temp) > 0:
-            ret["package"] = package_temp
-            
-        if len(core_temp) > 0:
-            ret["core"] = core_temp
-        
-    else:
-        if package_temp:
-            package_temp_avr = sum(x for x in package_temp) / len(package_temp)
-            ret["package"] =  round(package_temp_avr, 1)
-            
-        if core_temp:
-            core_temp_avr = sum(x for x in core_temp) / len(core_temp)
-            ret["core"] = round(core_temp_avr, 1)
-        
     logger.debug("CPU temp: %s", ret)
-    
+
     return ret
-    
+
 def get_temp_sensors() -> list:
     """get_temp_sensors Function to get all available temeprature sensors in system
 
     Returns:
-        list: list of sensors
+        list: list of (sensor, probe count) pairs
     """
-    ret = []
-    out = psutil.sensors_temperatures()
-    keys = out.keys()
-    
-    for key in keys:
-        if len(out[key]) > 1:
-            ret.append((key, len(out[key])))
-            
-        else:
-            ret.append((key, 1))
-            
+    ret = list(sensors.get_registry().chips().items())
+
     logger.debug("Available temp sensors: %s", ret)
-    
+
     return ret
-    
+
 def get_temp_by_sensor(sensor: str) -> list:
     """get_temp_by_sensor Function to read temperature by specific sensor
 
@@ -344,299 +364,189 @@ def get_temp_by_sensor(sensor: str) -> list:
         sensor (str): sensor name
 
     Returns:
-        list: temperature values
+        list: (label, temperature) pairs
     """
-    ret = []
-    out = psutil.sensors_temperatures()
-    keys = out.keys()
-    
-    if sensor in keys:
-        probes = out[sensor]
-        
-        for probe in probes:
-            ret.append((probe.label, probe.current))
-            
+    registry = sensors.get_registry()
+
+    if sensor in registry.chips():
+        ret = [(item.label, value) for item, value in registry.read() if item.chip == sensor]
         logger.debug("%s probes: %s", sensor, ret)
         return ret
-    
+
     logger.error("Sensor: %s is not available", sensor)
-    return None        
-    
+    return None
 
-def get_available_updates(password: str) -> list:
-    """get_available_updates Function to check available updates on server
+def get_temperatures() -> list:
+    """get_temperatures Function to read every temperature sensor in one sweep
 
     Returns:
-        list: list containing available packets updates
+        list: dicts with chip, device, kind, label, input, role and celsius
     """
-    ret = []
-    
-    command_echo = xsplit(f"""echo "{password}" """)
-    echo_proc = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = echo_proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-    
-    command = xsplit("sudo -S apt update")
-    proc = sproc.Popen( command,
-                        stdin=echo_proc.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-
-        if return_code is None:
-            continue
+    return [{
+        "chip": sensor.chip,
+        "device": sensor.device,
+        "kind": sensor.kind,
+        "label": sensor.label,
+        "input": sensor.input,
+        "role": sensor.role,
+        "celsius": value,
+    } for sensor, value in sensors.get_registry().read()]
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
-
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
 
+def get_update_status(password: str, background: bool = False) -> dict:
+    """get_update_status Function to get cached update check with its age
 
-    command = xsplit("sudo -S apt list --upgradable")
-    proc = sproc.Popen( command,
-                        stdin=echo_proc.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
+    Args:
+        password (str): sudo password
+        background (bool): return stale cached result while refreshing in background
 
-    while True:
-        return_code = proc.poll()
+    Returns:
+        dict: updates list, checked unix time, age seconds and stale flag, None if check failed
+    """
+    return updates.get_checker().check(password, background)
 
-        if return_code is None:
-            continue
+def get_available_updates(password: str) -> list:
+    """get_available_updates Function to check available updates on server
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
+    Returns:
+        list: list containing available packets updates
+    """
+    status = get_update_status(password)
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break    
-
-    for line in proc.stdout.readlines()[1::]:
-        line_split = line.strip().split(" ")
-        ret.append(line_split[0] + ": " + line_split[-1][0:-1:] + " -> " + line_split[1])
-        
-    if ret is not None:
+    if status is not None:
         logger.debug("Update list generated")
-        logger.debug("Update list: %s" % ret)
-        return ret
+        logger.debug("Update list: %s" % status["updates"])
+        return status["updates"]
     else:
         logger.error("Update list not generated")
         return None
-    
+
+def stream_available_updates(password: str) -> Iterator[dict]:
+    """stream_available_updates Function to upgrade packages yielding progress events
+
+    Args:
+        password (str): sudo password
+
+    Yields:
+        dict: progress events, last one is "summary", see updates.stream_upgrade
+    """
+    for event in updates.stream_upgrade(password, timeout=APT_UPGRADE_TIMEOUT):
+        if event["event"] == "summary" and event["ok"]:
+            # Upgrade may bring new kernel and makes update check outdated
+            cache.invalidate("kernel_version")
+            updates.get_checker().invalidate()
+        yield event
+
 def execute_available_updates(password: str) -> int:
-    command_echo = xsplit(f"""echo "{password}" """)
-    echo_proc = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = echo_proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return 0
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-        
-    command = xsplit("sudo -S apt upgrade -y")
-    proc = sproc.Popen( command,
-                        stdin=echo_proc.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-
-        if return_code is None:
-            continue
+    summary = None
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return 0
+    for event in stream_available_updates(password):
+        summary = event
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-    
-    out = proc.stdout.readlines()[-1].strip().split(" ")[0]
+    if summary is None or not summary["ok"]:
+        return 0
+
+    out = summary["upgraded"]
     logger.debug("%s packages updated" % out)
-    
+
     return out
 
 def execute_system_reboot(password: str) -> bool:
     """execute_system_reboot Funtion to execute full system reboot
     """
-    
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-    
-    
-    command_reboot = xsplit("sudo -S reboot now")
-    proc = sproc.Popen( command_reboot,
-                        stdin=proc.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_reboot)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_reboot)
-            break
-    
-    return True
-        
+    return runner.run_sudo(password, xsplit("reboot now")).ok
+
 def execute_system_shutdown(password: str) -> None:
     """execute_system_shutdown Function to execute full system shutdown
     """
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-    
-    
-    command_shutdown = xsplit("sudo -S shutdown now")
-    proc = sproc.Popen( command_shutdown,
-                        stdin=proc.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_shutdown)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_shutdown)
-            break
-    
-    return True
-    
+    return runner.run_sudo(password, xsplit("shutdown now")).ok
+
 def get_public_ip() -> str:
     """get_public_ip Function to get public IP
 
+    Address is cached for an hour and refreshed in background, last known
+    address is returned while resolvers fail.
+
     Returns:
-        str: public ipv4
+        str: public ip address
     """
-    
-    command = xsplit("curl ifconfig.me")
-    
-    proc = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-
-        if return_code is None:
-            continue
+    return publicip.get_resolver().get()
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
+def get_local_ip() -> str:
+    """get_local_ip Function to get local IP
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break 
-        
-    #logger.debug("Public IP: %s" % proc.stdout.readline().strip())    
-    return proc.stdout.readline().strip()
+    Returns:
+        str: local ipv4
+    """
+    ret = providers.get_local_ip()
+    logger.debug("Local IP: %s", ret)
+    return ret
 
-def get_local_ip() -> str:
-    """get_public_ip Function to get public IP
+def get_net_io(window: float = 1.0) -> dict:
+    """get_net_io Function to get per interface traffic from background sampler
+
+    Args:
+        window (float): seconds to average over
 
     Returns:
-        str: public ipv4
+        dict: interface -> per second rx/tx bytes, packets, errors and drops, up flag,
+            link speed in Mbit/s and utilisation percent of faster direction when speed is known
     """
-    
-    command = xsplit("hostname -I")
-    
-    proc = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-
-        if return_code is None:
+    rates = get_net_io_sampler().rates(window)
+    stats = psutil.net_if_stats()
+
+    for interface, item in rates.items():
+        link = stats.get(interface)
+        item["up"] = link.isup if link is not None else False
+        item["speed"] = link.speed if link is not None else 0
+        item["utilisation"] = None
+
+        if item["speed"] > 0:
+            busiest = max(item["rx_bytes"], item["tx_bytes"]) * 8
+            item["utilisation"] = round(busiest / (item["speed"] * 10 ** 6) * 100, 1)
+
+    return rates
+
+def get_tcp_states() -> dict:
+    """get_tcp_states Function to get tcp socket counts by state from background sampler
+
+    Returns:
+        dict: state name -> socket count
+    """
+    return get_tcp_state_sampler().states()
+
+def get_network(window: float = 1.0) -> dict:
+    """get_network Function to get interface traffic and tcp socket states
+
+    Args:
+        window (float): seconds to average traffic over
+
+    Returns:
+        dict: interfaces dict and tcp dict
+    """
+    return {"interfaces": get_net_io(window), "tcp": get_tcp_states()}
+
+def _format_net_io(net_io: dict) -> dict:
+    ret = dict()
+
+    for interface, rates in net_io.items():
+        if interface == "lo" or not rates["up"]:
             continue
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
+        ret[interface] = {
+            "rx": f"{bytes2human(rates['rx_bytes'])}/s",
+            "tx": f"{bytes2human(rates['tx_bytes'])}/s",
+            "errors": round(rates["rx_errors"] + rates["tx_errors"], 1),
+            "drops": round(rates["rx_drops"] + rates["tx_drops"], 1),
+        }
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break 
-        
-    #logger.debug("Public IP: %s" % proc.stdout.readline().strip())    
-    return proc.stdout.readline().strip().split()[0]
+        if rates["utilisation"] is not None:
+            ret[interface]["utilisation"] = f"{rates['utilisation']}%"
+
+    return ret
+
+def _format_tcp_states(states: dict) -> dict:
+    return {state.lower(): count for state, count in states.items() if count}
 
 def get_first_proc_by_cpu() -> str:
     """get_first_proc_by_cpu Function to get most cpu demanding process
@@ -644,239 +554,248 @@ def get_first_proc_by_cpu() -> str:
     Returns:
         str: process name
     """
-    ret = ""
-    command = xsplit("top -b -n 1")
-    proc_top = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc_top.poll()
-        if return_code is None:
-            continue
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-        
-    command = xsplit("head -n 8")
-    proc_head = sproc.Popen( command,
-                        stdin=proc_top.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc_head.poll()
-        if return_code is None:
-            continue
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-        
-    command = xsplit("tail -n 1")
-    proc_tail = sproc.Popen( command,
-                        stdin=proc_head.stdout,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc_head.poll()
-        if return_code is None:
-            continue
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-    
-    
-    out = proc_tail.stdout.readline().strip()
-        
-    if out and out != "":
-        index = len(out) - 1
-        
-        while not(out[index - 1].isnumeric() and out[index] == " "):
-            index -= 1
-            
-        ret = out[index + 1::]
-    
-    
+    ret = providers.get_top_process_by_cpu()
+    logger.debug("Top process: %s", ret)
     return ret
 
-def get_kernel_version() ->str:
-    command = xsplit("uname -r")
-    proc = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
+def get_top_processes(count: int = 5, key: str = "cpu") -> list:
+    """get_top_processes Function to get processes with highest usage since previous call
 
-        if return_code is None:
-            continue
+    Args:
+        count (int): number of processes
+        key (str): ranking key: cpu, rss, io or fds
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
+    Returns:
+        list: process dicts with pid, name, cpu, rss, io and fds
+    """
+    return procrank.get_ranker().top(count, key)
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-        
-    return proc.stdout.readline().strip()
+@cached("kernel_version")
+def get_kernel_version() ->str:
+    return providers.get_kernel_version()
 
 
+@cached("hostname", HOSTNAME_TTL)
 def get_hostname() ->str:
-    command = xsplit("hostname")
-    proc = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
+    return providers.get_hostname()
 
-    while True:
-        return_code = proc.poll()
+def _humanize_sizes(sizes: dict) -> dict:
+    return {key: bytes2human(value) if key in ("total", "used", "free") else value for key, value in sizes.items()}
 
-        if return_code is None:
-            continue
+def get_disk_usage(path: str, raw: bool = False) -> dict:
+    """get_disk_usage Function to get usage of filesystem holding path
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
-
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-        
-    return proc.stdout.readline().strip()
+    Args:
+        path (str): path on filesystem
+        raw (bool): sizes in bytes instead of human readable strings
 
-def get_disk_usage(path: str) -> dict:
+    Returns:
+        dict: total, used, free and percent, zeros if path does not exist
+    """
     ret = {
         "total": 0,
         "used": 0,
         "free": 0,
         "percent": 0,
     }
-    
+
     if os_exists(path):
         out = psutil.disk_usage(path)
-        
-        ret["total"] = bytes2human(out.total)
-        ret["used"] = bytes2human(out.used)
-        ret["free"] = bytes2human(out.free)
+
+        ret["total"] = out.total
+        ret["used"] = out.used
+        ret["free"] = out.free
         ret["percent"] = out.percent
-        
+
+    if not raw:
+        ret = _humanize_sizes(ret)
+
     return ret
 
-def get_disk_name(mountpoint: str) -> str:
-    ret = ""
-    
-    command = xsplit("lsblk -J  -o NAME,MOUNTPOINT,MODEL")
-    proc = sproc.Popen( command,
-                        stdin=sproc.PIPE,
-                        stdout=sproc.PIPE,
-                        stderr=sproc.PIPE,
-                        encoding="utf-8",)
-
-    while True:
-        return_code = proc.poll()
-
-        if return_code is None:
+def get_disks_usage() -> list:
+    """get_disks_usage Function to get usage of every mounted block device filesystem
+
+    Pseudo and overlay filesystems have no block device and are skipped
+    together with read-only images.
+
+    Returns:
+        list: dicts with mountpoint, device, fstype, total, used, free in bytes and percent
+    """
+    ret = []
+
+    for mount in blockdev.get_index().mounts():
+        if mount["fstype"] in DISK_SKIP_FSTYPES:
             continue
 
-        if return_code == 1:
-            logger.error("Command %s not ended successfully" % command)
-            return None
+        try:
+            usage = psutil.disk_usage(mount["mountpoint"])
+        except OSError as err:
+            logger.error("Disk usage of %s failed: %s", mount["mountpoint"], err)
+            continue
 
-        else:
-            logger.debug("Command %s ended with success" % command)
-            break
-    
-    devices = json.load(proc.stdout)["blockdevices"]
-    
-    for device in devices:
-        if device["children"]:
-            for children in device["children"]:
-                if type(children) is dict:
-                    if children["mountpoint"] == mountpoint:
-                        if children["model"]:
-                            ret = device["model"]
-                        else:
-                            ret = device["name"]
-                        break
-        
-        if ret != "":
-            break
-        
+        ret.append({
+            "mountpoint": mount["mountpoint"],
+            "device": mount["device"],
+            "fstype": mount["fstype"],
+            "total": usage.total,
+            "used": usage.used,
+            "free": usage.free,
+            "percent": usage.percent,
+        })
+
+    logger.debug("Disks usage: %s", ret)
+
+    return ret
+
+def get_disk_io(window: float = 1.0) -> dict:
+    """get_disk_io Function to get throughput and IOPS of devices backing mounts
+
+    Args:
+        window (float): seconds to average over
+
+    Returns:
+        dict: device -> read_bytes, write_bytes, read_iops, write_iops per second and busy percent
+    """
+    devices = set()
+
+    for mount in blockdev.get_index().mounts():
+        devices.add(mount["device"])
+        devices.update(disk["name"] for disk in mount["disks"])
+
+    rates = get_disk_io_sampler().rates(window)
+
+    return {device: rates[device] for device in sorted(devices) if device in rates}
+
+def get_disks(window: float = 1.0) -> dict:
+    """get_disks Function to get usage of all mounts and I/O of their devices
+
+    Args:
+        window (float): seconds to average I/O over
+
+    Returns:
+        dict: mounts list and io dict
+    """
+    return {"mounts": get_disks_usage(), "io": get_disk_io(window)}
+
+def _format_disks_usage(mounts: list) -> dict:
+    return {mount["mountpoint"]: _format_percent(mount["percent"]) for mount in mounts}
+
+def _format_disk_io(disk_io: dict) -> dict:
+    return {device: {
+        "read": f"{bytes2human(rates['read_bytes'])}/s",
+        "write": f"{bytes2human(rates['write_bytes'])}/s",
+        "iops": round(rates["read_iops"] + rates["write_iops"], 1),
+        "busy": f"{rates['busy']}%",
+    } for device, rates in disk_io.items()}
+
+def get_disk_name(mountpoint: str) -> str:
+    """get_disk_name Function to get model of disk holding mountpoint
+
+    Partitions, LVM, LUKS and RAID layers are followed down to physical
+    disks, device name is used when disk reports no model.
+
+    Args:
+        mountpoint (str): mountpoint, e.g. "/"
+
+    Returns:
+        str: disk model or name, empty if mountpoint is not on block device
+    """
+    ret = blockdev.get_index().disk_name(mountpoint)
+    logger.debug("Disk of %s: %s", mountpoint, ret)
     return ret
 
 def get_installed_packages() -> int:
-    ret = 0
-    
-    out = sproc.getoutput("dpkg -l | grep -c '^ii'")    
-    
-    if out != "":
-        try:
-            ret = int(out)
-        except:
-            ret = 0     
+    """get_installed_packages Function to count installed packages
+
+    Status database is parsed again only after dpkg changed it.
+
+    Returns:
+        int: installed package count
+    """
+    ret = dpkg.get_inventory().count()
+
+    logger.debug("Installed packages: %s", ret)
+
+    return ret
+
+def get_package_inventory(versions: bool = False, diff: bool = False) -> dict:
+    """get_package_inventory Function to get installed packages overview
+
+    Args:
+        versions (bool): include installed version of every package
+        diff (bool): compare last update check with installed versions
+
+    Returns:
+        dict: installed count, optionally versions and diff
+    """
+    inventory = dpkg.get_inventory()
+    ret = {"installed": inventory.count()}
+
+    if versions:
+        ret["versions"] = inventory.versions()
+
+    if diff:
+        status = updates.get_checker().cached()
+        ret["diff"] = inventory.diff(status["updates"]) if status is not None else None
+
     return ret
 
-def get_docker_containers(password: str) -> str:
+def _docker_api() -> dockerapi.DockerClient:
+    """_docker_api Function to get Engine API client if docker socket is usable
+
+    Returns:
+        DockerClient: shared client or None if docker CLI through sudo has to be used
+    """
+    client = dockerapi.get_client()
+
+    if client.is_available():
+        return client
+
+    return None
+
+def get_docker_containers(password: str) -> dict:
+    """get_docker_containers Function to list all containers
+
+    Args:
+        password (str): sudo password, used when Docker API socket is not available
+
+    Returns:
+        dict: "containers" list with name, state and runtime, "items" count, False on failure
+    """
     ret = dict()
-    
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc_echo = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_echo.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-    
-    command_docker = xsplit("""sudo -S docker ps -a --format \"{{.Names}} {{.State}} {{.RunningFor}}\" """)
-    proc_docker = sproc.Popen(command_docker,
-                       stdin=proc_echo.stdout,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_docker.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_docker)
+
+    client = _docker_api()
+
+    if client is not None:
+        try:
+            summaries = client.containers(all=True)
+        except (dockerapi.DockerError, OSError) as err:
+            logger.error("Docker containers list failed: %s", err)
             return False
-        else:
-            logger.debug("Command %s ended with success" % command_docker)
-            break
-        
-    lines = proc_docker.stdout.readlines()
-    
+
+        containers = [{
+            "name": dockerapi.container_name(summary),
+            "state": summary.get("State", ""),
+            "runtime": dockerapi.running_for(summary),
+        } for summary in summaries]
+        containers = sorted(containers, key=lambda item: item["name"])
+
+        ret = {
+            "containers": containers,
+            "items": len(containers),
+        }
+
+        return ret
+
+    result = runner.run_sudo(password, xsplit("""docker ps -a --format \"{{.Names}} {{.State}} {{.RunningFor}}\" """), timeout=DOCKER_TIMEOUT)
+
+    if not result.ok:
+        return False
+
+    lines = result.stdout.splitlines()
+
     containers = []
-    
+
     for line in lines:
         line = line.strip()
         items = line.split(" ")
@@ -889,265 +808,555 @@ def get_docker_containers(password: str) -> str:
             "runtime": runtime,
         }
         containers.append(container)
-    
-    containers = sorted(containers, key=lambda item: item["name"])    
-    
+
+    containers = sorted(containers, key=lambda item: item["name"])
+
     ret = {
         "containers": containers,
         "items": len(containers),
     }
-    
-    return json.dumps(ret)
+
+    return ret
+
+
+def _container_action(password: str, action: str, container: str, dedicated: bool = False) -> tuple[bool, str]:
+    """_container_action Function to run docker lifecycle action on container
+
+    Args:
+        password (str): sudo password
+        action (str): docker action, start, stop or restart
+        container (str): container name
+        dedicated (bool): use own connection instead of shared one, parallel callers do not wait for each other
+
+    Returns:
+        tuple[bool, str]: True if docker confirmed action on container, error message or None
+    """
+    client = _docker_api()
+
+    if client is not None:
+        if dedicated:
+            client = dockerapi.DockerClient(client.socket_path, client.timeout)
+        try:
+            return getattr(client, action)(container), None
+        except (dockerapi.DockerError, OSError) as err:
+            logger.error("Docker %s %s failed: %s", action, container, err)
+            return False, str(err)
+        finally:
+            if dedicated:
+                client.close()
+
+    result = runner.run_sudo(password, ["docker", action, container], timeout=DOCKER_TIMEOUT)
+
+    if not result.ok:
+        return False, "timed out" if result.timed_out else result.stderr.strip()
+
+    output = result.stdout.splitlines()
+
+    if output and output[0].strip().lower() == container.lower():
+        return True, None
+
+    return False, "unexpected docker output"
+
+
+def _execute_container_action(password: str, action: str, container: str) -> bool:
+    return _container_action(password, action, container)[0]
+
+
+def _list_containers(password: str) -> list:
+    """_list_containers Function to list all containers with their labels
+
+    Args:
+        password (str): sudo password
+
+    Returns:
+        list: dicts with name, state and labels, None if docker failed
+    """
+    client = _docker_api()
+
+    if client is not None:
+        try:
+            return [{
+                "name": dockerapi.container_name(summary),
+                "state": summary.get("State", ""),
+                "labels": summary.get("Labels") or {},
+            } for summary in client.containers(all=True)]
+        except (dockerapi.DockerError, OSError) as err:
+            logger.error("Docker containers list failed: %s", err)
+            return None
+
+    result = runner.run_sudo(password, ["docker", "ps", "-a", "--format", "{{.Names}}|{{.State}}|{{.Labels}}"], timeout=DOCKER_TIMEOUT)
+
+    if not result.ok:
+        return None
+
+    ret = []
+
+    for line in result.stdout.splitlines():
+        name, state, labels = (line.strip().split("|", 2) + ["", ""])[:3]
+        ret.append({
+            "name": name,
+            "state": state,
+            "labels": dict(label.partition("=")[::2] for label in labels.split(",") if label),
+        })
+
+    return ret
+
+
+def execute_containers_bulk(password: str, action: str, groups: list, concurrency: int = bulk.DEFAULT_CONCURRENCY) -> dict:
+    """execute_containers_bulk Function to start, stop or restart many containers at once
+
+    Args:
+        password (str): sudo password
+        action (str): start, stop or restart
+        groups (list): ordered lists of selectors: names, globs or label:key[=value],
+            each group finishes before next one starts
+        concurrency (int): max parallel operations inside group
+
+    Returns:
+        dict: action, ok, duration, per container results, selectors that matched nothing
+            and error of whole operation, e.g. when containers could not be listed
+    """
+    if action not in ("start", "stop", "restart"):
+        raise ValueError(f"Unknown bulk action: {action}")
+
+    containers = None
+
+    if any(bulk.needs_listing(selectors) for selectors in groups):
+        containers = _list_containers(password)
+
+        if containers is None:
+            return {
+                "action": action,
+                "ok": False,
+                "duration": 0.0,
+                "items": 0,
+                "results": [],
+                "unmatched": [],
+                "error": "could not list containers",
+            }
+
+    resolved = []
+    unmatched = []
+
+    for selectors in groups:
+        names, missing = bulk.select(selectors, containers)
+        resolved.append(names)
+        unmatched.extend(missing)
+
+    ret = bulk.run_groups(action, resolved, lambda name: _container_action(password, action, name, dedicated=True),
+                           concurrency)
+    ret["unmatched"] = unmatched
+    ret["error"] = None
+
+    return ret
 
 
 def execute_container_start(password: str, container: str) -> bool:
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc_echo = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_echo.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-        
-    command_docker = xsplit(f"sudo -S docker start {container}")
-    proc_docker = sproc.Popen(command_docker,
-                       stdin=proc_echo.stdout,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_docker.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_docker)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_docker)
-            break
-        
-    output = proc_docker.stdout.readlines()
-    
-    if output[0].strip().lower() == container.lower():
-        return True
-    
-    return False
-        
-    
+    return _execute_container_action(password, "start", container)
+
+
 def execute_container_stop(password: str, container: str) -> bool:
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc_echo = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_echo.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-        
-    command_docker = xsplit(f"sudo -S docker stop {container}")
-    proc_docker = sproc.Popen(command_docker,
-                       stdin=proc_echo.stdout,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_docker.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_docker)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_docker)
-            break
-        
-    output = proc_docker.stdout.readlines()
-    
-    if output[0].strip().lower() == container.lower():
-        return True
-    
-    return False
+    return _execute_container_action(password, "stop", container)
 
 
 def execute_container_restart(password: str, container: str) -> bool:
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc_echo = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_echo.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-        
-    command_docker = xsplit(f"sudo -S docker restart {container}")
-    proc_docker = sproc.Popen(command_docker,
-                       stdin=proc_echo.stdout,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_docker.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_docker)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_docker)
-            break
-        
-    output = proc_docker.stdout.readlines()
-    
-    if output[0].strip().lower() == container.lower():
-        return True
-    
-    return False
-
-
-def get_container_stats(password: str, container: str) -> str:
-    command_echo = xsplit(f"""echo "{password}" """)
-    proc_echo = sproc.Popen(command_echo,
-                       stdin=sproc.PIPE,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_echo.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_echo)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_echo)
-            break
-        
-    command_docker = xsplit(""" sudo -S docker stats --no-stream --format "{{.Name}}|{{.CPUPerc}}|{{.MemUsage}}|{{.NetIO}}|{{.BlockIO}}" """)
-    proc_docker = sproc.Popen(command_docker,
-                       stdin=proc_echo.stdout,
-                       stdout=sproc.PIPE,
-                       stderr=sproc.PIPE,
-                       encoding="utf-8")
-    
-    while True:
-        return_code = proc_docker.poll()
-        
-        if return_code is None: continue
-        elif return_code == 1:
-            logger.error("Command %s not ended successfully" % command_docker)
-            return False
-        else:
-            logger.debug("Command %s ended with success" % command_docker)
-            break
-        
-    output = proc_docker.stdout.readlines()
-    
-    proper_line = ""
-        
-    for line in output:
-        if(line.find(container.lower()) != -1):
-            proper_line = line.strip()
-            break
-        
-    if proper_line == "":
+    return _execute_container_action(password, "restart", container)
+
+
+def _collect_container_stats(password: str, containers: list) -> dict:
+    """_collect_container_stats Function to get stats of requested containers only
+
+    Args:
+        password (str): sudo password
+        containers (list): container names
+
+    Returns:
+        dict: container name -> stats dict, None if stats could not be read
+    """
+    ret = dict()
+    client = _docker_api()
+
+    if client is not None:
+        for container, stats in client.stats_many(containers).items():
+            # Engine answers with zeroed document and zero read time for stopped containers
+            if stats.get("read", "0001-").startswith("0001-"):
+                continue
+            parsed = dockerapi.parse_stats(stats)
+            # Engine resolves id prefixes too, keep only exact names
+            if parsed["name"] == container:
+                ret[container] = dockerapi.format_stats(parsed)
+
+        return ret
+
+    command = xsplit("""docker stats --no-stream --format "{{.Name}}|{{.CPUPerc}}|{{.MemUsage}}|{{.NetIO}}|{{.BlockIO}}" """)
+    result = runner.run_sudo(password, command + list(containers), timeout=DOCKER_TIMEOUT)
+
+    if not result.ok:
+        if result.timed_out:
+            return None
+
+        # docker exits with error when any name does not exist, other containers may still be printed
+        absent = set(dockerapi.NO_SUCH_CONTAINER.findall(result.stderr))
+        remaining = [container for container in containers if container not in absent]
+
+        if not absent or len(remaining) == len(containers):
+            return None
+
+        if remaining and not any(line.split("|", 1)[0].strip() in remaining for line in result.stdout.splitlines()):
+            return _collect_container_stats(password, remaining)
+
+    for line in result.stdout.splitlines():
+        proper_line = line.strip().split("|")
+
+        if len(proper_line) != 5 or proper_line[0] not in containers:
+            continue
+
+        ret[proper_line[0]] = {
+            "name": proper_line[0],
+            "cpu": proper_line[1],
+            "ram": proper_line[2],
+            "net_io": proper_line[3],
+            "disk_io": proper_line[4],
+        }
+
+    return ret
+
+
+def get_container_stats(password: str, container: str) -> dict:
+    """get_container_stats Function to get stats of one container
+
+    Args:
+        password (str): sudo password
+        container (str): container name, matched exactly
+
+    Returns:
+        dict: container stats, False if container is not running
+    """
+    stats = _collect_container_stats(password, [container])
+
+    if not stats or container not in stats:
+        return False
+
+    return stats[container]
+
+
+def get_containers_stats(password: str, containers: list) -> dict:
+    """get_containers_stats Function to get stats of several containers in one call
+
+    Args:
+        password (str): sudo password
+        containers (list): container names, matched exactly
+
+    Returns:
+        dict: "containers" stats list, "items" count and "missing" names
+    """
+    stats = _collect_container_stats(password, containers)
+
+    if stats is None:
         return False
-    
-    proper_line = proper_line.split("|")
-    
-    stats  = {
-        "name": proper_line[0],
-        "cpu": proper_line[1],
-        "ram": proper_line[2],
-        "net_io": proper_line[3],
-        "disk_io": proper_line[4],
+
+    ret = {
+        "containers": [stats[container] for container in containers if container in stats],
+        "items": len(stats),
+        "missing": [container for container in containers if container not in stats],
+    }
+
+    return ret
+
+
+def get_container_stats_feed(password: str, containers: list, window: float = statsfeed.DEFAULT_WINDOW) -> dict:
+    """get_container_stats_feed Function to get rolling stats aggregates of containers
+
+    First call subscribes to stats stream of containers, later calls read
+    aggregates of samples collected since.
+
+    Args:
+        password (str): sudo password, used when docker socket is not usable
+        containers (list): container names
+        window (float): seconds to aggregate over
+
+    Returns:
+        dict: container -> min/avg/max/p95 of cpu, mem, net and block io rates
+    """
+    feed = statsfeed.get_feed()
+    feed.subscribe(containers, password)
+
+    return feed.aggregate(containers, window)
+
+
+def get_container_stats_latest(password: str, containers: list = None) -> dict:
+    """get_container_stats_latest Function to get newest streamed stats sample of containers
+
+    Args:
+        password (str): sudo password, used when docker socket is not usable
+        containers (list, optional): container names, running containers if not given
+
+    Returns:
+        dict: container -> cpu, mem, net and block io rates of newest sample, False if docker failed
+    """
+    if not containers:
+        listed = _list_containers(password)
+        if listed is None:
+            return False
+        containers = sorted(item["name"] for item in listed if item["state"] == "running")
+
+    feed = statsfeed.get_feed()
+    feed.subscribe(containers, password)
+
+    return feed.latest(containers)
+
+
+def get_history_sources() -> dict:
+    """get_history_sources Function to get metrics recorded into history store
+
+    Returns:
+        dict: metric name -> callable returning current value
+    """
+    return {
+        "cpu_percent": get_cpu_usage,
+        "ram_percent": lambda: psutil.virtual_memory().percent,
+        "swap_percent": lambda: psutil.swap_memory().percent,
+        "load_1m": lambda: psutil.getloadavg()[0],
+        "disk_root_percent": lambda: psutil.disk_usage("/").percent,
+        "disk_max_percent": lambda: max((mount["percent"] for mount in get_disks_usage()), default=None),
+    }
+
+
+_history_store = None
+
+
+def get_history_store() -> tsdb.TimeSeriesStore:
+    """get_history_store Function to get shared history store
+
+    Returns:
+        TimeSeriesStore: store in default directory
+    """
+    global _history_store
+
+    if _history_store is None:
+        _history_store = tsdb.TimeSeriesStore()
+
+    return _history_store
+
+
+def get_history(metric: str = None, since: str = "1h", tier: str = None) -> dict:
+    """get_history Function to read recorded metric history
+
+    Args:
+        metric (str, optional): metric name, list of stored metrics is returned if not given
+        since (str): range length, e.g. 15m, 6h, 7d
+        tier (str, optional): raw, 1m or 1h, finest tier covering range if not given
+
+    Returns:
+        dict: metric, tier and points, rollup points are [timestamp, min, avg, max]
+    """
+    store = get_history_store()
+
+    if metric is None:
+        return {"metrics": store.metrics()}
+
+    start = time() - tsdb.parse_duration(since)
+    tier = tier or store.pick_tier(start)
+
+    ret = {
+        "metric": metric,
+        "tier": tier,
+        "points": [list(point) for point in store.query(metric, start, tier=tier)],
     }
-    
-    ret = json.dumps(stats)
-    
+
+    return ret
+
+
+def get_metric_families() -> list:
+    """get_metric_families Function to collect probes as metric families for exporter
+
+    Returns:
+        list: list of exporter.Family with raw numeric values
+    """
+    vmem = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    load = psutil.getloadavg()
+
+    families = [
+        Family("memory_bytes", "gauge", "RAM in bytes", [
+            ({"type": "total"}, vmem.total), ({"type": "used"}, vmem.used), ({"type": "available"}, vmem.available)]),
+        Family("memory_used_percent", "gauge", "Used RAM percent", [({}, vmem.percent)]),
+        Family("swap_bytes", "gauge", "Swap in bytes", [
+            ({"type": "total"}, swap.total), ({"type": "used"}, swap.used), ({"type": "free"}, swap.free)]),
+        Family("swap_used_percent", "gauge", "Used swap percent", [({}, swap.percent)]),
+        Family("cpu_usage_percent", "gauge", "CPU utilisation over last second", [({}, get_cpu_usage())]),
+        Family("cpu_frequency_mhz", "gauge", "Current CPU frequency per core",
+               [({"core": str(core)}, freq) for core, freq in enumerate(get_cpu_freq(True))]),
+        Family("load_average", "gauge", "System load average", [
+            ({"period": "1m"}, load[0]), ({"period": "5m"}, load[1]), ({"period": "15m"}, load[2])]),
+    ]
+
+    thermal = get_thermal_sampler()
+    families.append(Family("cpu_throttling", "gauge", "CPU frequency is reduced while hot",
+                           [({}, thermal.throttling)]))
+    families.append(Family("cpu_throttle_episodes", "counter", "Throttling episodes since start",
+                           [({}, thermal.episode_count())]))
+    families.append(Family("temperature_celsius", "gauge", "Temperature sensor readings", [
+        ({"sensor": item.chip, "device": item.device, "kind": item.kind, "label": item.label, "input": item.input}, value)
+        for item, value in sensors.get_registry().read()]))
+
+    mounts = get_disks_usage()
+    families.append(Family("disk_bytes", "gauge", "Disk usage in bytes", [
+        ({"mountpoint": mount["mountpoint"], "device": mount["device"], "type": kind}, mount[kind])
+        for mount in mounts for kind in ("total", "used", "free")]))
+    families.append(Family("disk_used_percent", "gauge", "Used disk percent",
+                           [({"mountpoint": mount["mountpoint"], "device": mount["device"]}, mount["percent"])
+                            for mount in mounts]))
+
+    disk_io = get_disk_io()
+    families.append(Family("disk_io_bytes_per_second", "gauge", "Block device throughput", [
+        ({"device": device, "direction": direction}, rates[f"{direction}_bytes"])
+        for device, rates in disk_io.items() for direction in ("read", "write")]))
+    families.append(Family("disk_io_operations_per_second", "gauge", "Block device IOPS", [
+        ({"device": device, "direction": direction}, rates[f"{direction}_iops"])
+        for device, rates in disk_io.items() for direction in ("read", "write")]))
+    families.append(Family("disk_busy_percent", "gauge", "Time block device had I/O in flight",
+                           [({"device": device}, rates["busy"]) for device, rates in disk_io.items()]))
+
+    net_io = get_net_io()
+    for metric, key, help in (
+            ("network_bytes_per_second", "bytes", "Interface throughput"),
+            ("network_packets_per_second", "packets", "Interface packet rate"),
+            ("network_errors_per_second", "errors", "Interface error rate"),
+            ("network_drops_per_second", "drops", "Interface dropped packet rate")):
+        families.append(Family(metric, "gauge", help, [
+            ({"interface": interface, "direction": direction}, rates[f"{prefix}_{key}"])
+            for interface, rates in net_io.items() for direction, prefix in (("receive", "rx"), ("transmit", "tx"))]))
+    families.append(Family("network_utilisation_percent", "gauge", "Interface utilisation of link speed",
+                           [({"interface": interface}, rates["utilisation"]) for interface, rates in net_io.items()]))
+    families.append(Family("tcp_connections", "gauge", "TCP sockets by state",
+                           [({"state": state.lower()}, count) for state, count in get_tcp_states().items()]))
+
+    client = _docker_api()
+
+    if client is not None:
+        try:
+            running = [dockerapi.container_name(summary) for summary in client.containers(all=False)]
+        except (dockerapi.DockerError, OSError) as err:
+            logger.error("Docker containers list failed: %s", err)
+            running = []
+
+        parsed = [dockerapi.parse_stats(stats) for stats in client.stats_many(running).values()]
+
+        for metric, kind, key, help in (
+                ("container_cpu_percent", "gauge", "cpu", "Container CPU percent"),
+                ("container_memory_bytes", "gauge", "mem_used", "Container memory usage without page cache"),
+                ("container_network_receive_bytes", "counter", "net_rx", "Container bytes received"),
+                ("container_network_transmit_bytes", "counter", "net_tx", "Container bytes sent"),
+                ("container_block_read_bytes", "counter", "block_read", "Container bytes read from block devices"),
+                ("container_block_write_bytes", "counter", "block_write", "Container bytes written to block devices")):
+            families.append(Family(metric, kind, help, [({"name": stats["name"]}, stats[key]) for stats in parsed]))
+
+    return families
+
+
+def _format_percent(value: float) -> str:
+    return f"{value}%"
+
+def _format_cpu_temp(temps: dict) -> str:
+    # AMD and some ARM chips report only package temperature
+    value = temps.get("core", temps.get("package"))
+    return str(f"""{value} 'C""") if value is not None else None
+
+# Fields that do not change while process runs, watch mode collects them once
+DASHBOARD_STATIC = ("kernel", "hostname", "uptime_since", "disk_name")
+_dashboard_static = dict()
+
+# Dashboard probes collect raw values, these render them for display
+DASHBOARD_FORMATS = {
+    "cpu_temp": _format_cpu_temp,
+    "cpu_usage": _format_percent,
+    "ram_usage": _format_percent,
+    "swap_usage": _format_percent,
+    "disk_usage": _format_percent,
+    "disks": _format_disks_usage,
+    "disk_io": _format_disk_io,
+    "uptime": _format_uptime,
+    "uptime_since": _format_boot_time,
+    "net_io": _format_net_io,
+    "tcp": _format_tcp_states,
+    "packages": str,
+}
+
+def format_dashboard(values: dict) -> dict:
+    """format_dashboard Function to render raw dashboard values for display
+
+    Args:
+        values (dict): raw dashboard from refresh_dashboard
+
+    Returns:
+        dict: dashboard with human readable values
+    """
+    ret = dict()
+
+    for name, value in values.items():
+        formatter = DASHBOARD_FORMATS.get(name)
+        ret[name] = formatter(value) if formatter is not None and value is not None else value
+
     return ret
-        
-    
-def refresh_dashboard() -> dict:
-    
-    # CPU temp
-    # CPU usage
-    # RAM usage
-    # Kernel version
-    # Hostname
-    # Uptime
-    # Uptime since
-    # Stress app
-    # Public IP
-    # Local IP
-    # Packages
-        
-    ret = dict()    
-       
-    try:
-        ret["cpu_temp"] = str(f"""{get_cpu_temp(False)["core"]} 'C""")
-    except KeyError:
-        pass
-    
-    ret["cpu_usage"] = str(f"{psutil.cpu_percent(interval = 1)}%")
-    
-    ret["ram_usage"] = str(f"{psutil.virtual_memory().percent}%")
-    
-    ret["swap_usage"] = str(f"{psutil.swap_memory().percent}%")
-    
-    ret["disk_usage"] = str(f"""{get_disk_usage("/")["percent"]}%""")
-    
-    ret["disk_name"] = get_disk_name("/")
-    
-    ret['kernel'] = get_kernel_version()
-    
-    ret["hostname"] = get_hostname()
-    
-    ret["uptime"] = get_uptime(False)
-    
-    ret["uptime_since"] = get_uptime(True)
-    
-    ret["stress_app"] = get_first_proc_by_cpu()
-    
-    ret["public_ip"] = get_public_ip()
-    
-    ret["local_ip"] = get_local_ip()
-    
-    ret["packages"] = str(get_installed_packages())
-    
+
+def refresh_dashboard(budget: float = DASHBOARD_BUDGET, raw: bool = False, reuse_static: bool = False) -> dict:
+    """refresh_dashboard Function to collect basic server statistics
+
+    Probes run concurrently, values that did not arrive within their timeout or
+    the overall budget are served from previous collection and listed in
+    "stale", values never collected are listed in "missing".
+
+    Args:
+        budget (float): total seconds the collection may take
+        raw (bool): numbers in base units instead of human readable strings
+        reuse_static (bool): take static fields from previous collection instead of probing them
+
+    Returns:
+        dict: dashboard values
+    """
+    # First cpu delta is taken before probes start loading machine, waiting counts against budget
+    start = monotonic()
+    get_cpu_sampler().wait_ready(2, budget / 2)
+    budget = max(budget - (monotonic() - start), 0.0)
+
+    probes = [
+        Probe("cpu_temp", get_cpu_temp, args=(False,)),
+        Probe("cpu_usage", get_cpu_usage),
+        Probe("ram_usage", lambda: psutil.virtual_memory().percent),
+        Probe("swap_usage", lambda: psutil.swap_memory().percent),
+        Probe("disk_usage", lambda: get_disk_usage("/", raw=True)["percent"]),
+        Probe("disk_name", get_disk_name, args=("/",)),
+        Probe("disks", get_disks_usage),
+        Probe("disk_io", get_disk_io),
+        Probe("kernel", get_kernel_version),
+        Probe("hostname", get_hostname),
+        Probe("uptime", lambda: round(time() - _get_boot_time())),
+        Probe("uptime_since", _get_boot_time),
+        Probe("stress_app", get_first_proc_by_cpu),
+        Probe("public_ip", get_public_ip),
+        Probe("local_ip", get_local_ip),
+        Probe("net_io", get_net_io),
+        Probe("tcp", get_tcp_states),
+        Probe("packages", get_installed_packages),
+    ]
+
+    static = dict(_dashboard_static) if reuse_static else dict()
+    names = [probe.name for probe in probes]
+
+    values, stale, missing = collect([probe for probe in probes if probe.name not in static], budget)
+
+    _dashboard_static.update({name: values[name] for name in DASHBOARD_STATIC if name in values and name not in stale})
+    values.update(static)
+    ret = {name: values[name] for name in names if name in values}
+
+    if ret.get("public_ip") is not None and publicip.get_resolver().stale and "public_ip" not in stale:
+        stale.append("public_ip")
+
+    if not raw:
+        ret = format_dashboard(ret)
+
+    ret["stale"] = stale
+    ret["missing"] = missing
+
     return ret
-        
-        
-        
-        
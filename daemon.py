@@ -0,0 +1,235 @@
+""" Long running copilot daemon serving queries over Unix domain socket
+
+Protocol is newline delimited JSON. Each request line is a dict with
+"command" key and command specific arguments, each answer line is
+{"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+"""
+import json
+import logging
+import os
+import socketserver
+import threading
+from time import monotonic
+
+import client
+import commands
+import runner
+import tsdb
+import exporter
+import updates
+from cache import cache
+from sampler import get_cpu_sampler, get_disk_io_sampler, get_net_io_sampler, get_tcp_state_sampler, \
+    get_thermal_sampler
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_REFRESH_INTERVAL = 5.0
+
+
+def handle_request(request: dict):
+    """handle_request Function to execute request in current process
+
+    Args:
+        request (dict): request with "command" key and its arguments
+
+    Raises:
+        ValueError: unknown command or action
+
+    Returns:
+        Any: command result
+    """
+    command = request.get("command")
+    action = request.get("action")
+    password = request.get("password", "")
+    container = request.get("container")
+
+    if command == "dash":
+        return commands.refresh_dashboard(raw=request.get("raw", False), reuse_static=request.get("watch", False))
+
+    elif command == "stats":
+        return {"cache": cache.stats(), "commands": runner.get_command_durations(),
+                "cpu": get_cpu_sampler().usage_windows()}
+
+    elif command == "procs":
+        return commands.get_top_processes(request.get("count", 5), request.get("sort", "cpu"))
+
+    elif command == "history":
+        return commands.get_history(request.get("metric"), request.get("since", "1h"), request.get("tier"))
+
+    elif command == "disks":
+        return commands.get_disks(request.get("window", 1.0))
+
+    elif command == "net":
+        return commands.get_network(request.get("window", 1.0))
+
+    elif command == "sensors":
+        return commands.get_temperatures()
+
+    elif command == "thermal":
+        return commands.get_thermal(request.get("window", 60.0), request.get("since"))
+
+    elif command == "packages":
+        return commands.get_package_inventory(request.get("versions", False), request.get("diff", False))
+
+    elif command == "reboot":
+        return commands.execute_system_reboot(password)
+
+    elif command == "shutdown":
+        return commands.execute_system_shutdown(password)
+
+    elif command == "update":
+        if action == "check":
+            return commands.get_update_status(password, request.get("background", False))
+        elif action == "run":
+            return commands.execute_available_updates(password)
+
+    elif command == "docker":
+        if action == "show":
+            return commands.get_docker_containers(password)
+        elif action == "start":
+            return commands.execute_container_start(password, container)
+        elif action == "stop":
+            return commands.execute_container_stop(password, container)
+        elif action == "restart":
+            return commands.execute_container_restart(password, container)
+        elif action == "bulk":
+            return commands.execute_containers_bulk(password, request.get("operation"), request.get("groups", []),
+                                                    request.get("concurrency", 4))
+        elif action == "feed":
+            containers = container if isinstance(container, list) else [container]
+            return commands.get_container_stats_feed(password, containers, request.get("window", 60.0))
+        elif action == "latest":
+            containers = container if isinstance(container, list) or container is None else [container]
+            return commands.get_container_stats_latest(password, containers)
+        elif action == "stats":
+            if isinstance(container, list):
+                return commands.get_containers_stats(password, container)
+            return commands.get_container_stats(password, container)
+
+    raise ValueError(f"Unknown request: {command} {action}")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.server.daemon.handle(request)}
+            except Exception as err:
+                logger.error("Request failed: %s", err)
+                response = {"ok": False, "error": str(err)}
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon:
+    """Daemon Socket server keeping collectors warm between queries
+
+    Args:
+        socket_path (str): path of Unix socket to listen on
+        refresh_interval (float): seconds between background dashboard refreshes
+        record_interval (float): seconds between samples recorded into history store
+        metrics_port (int, optional): port of OpenMetrics endpoint, disabled if not given
+    """
+
+    def __init__(self, socket_path: str, refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+                 record_interval: float = tsdb.DEFAULT_RECORD_INTERVAL, metrics_port: int = None):
+        self.socket_path = socket_path
+        self.metrics_port = metrics_port
+        self.refresh_interval = refresh_interval
+        self.record_interval = record_interval
+        self._dashboard = None
+        self._dashboard_time = 0.0
+        self._stop = threading.Event()
+        self._server = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dashboard = commands.refresh_dashboard(raw=True)
+                self._dashboard_time = monotonic()
+            except Exception as err:
+                logger.error("Dashboard refresh failed: %s", err)
+
+            self._stop.wait(self.refresh_interval)
+
+    def handle(self, request: dict):
+        """handle Function to answer request, dashboard comes from warm snapshot
+
+        Args:
+            request (dict): request with "command" key and its arguments
+
+        Raises:
+            ValueError: command is not served by daemon
+
+        Returns:
+            Any: command result
+        """
+        command = request.get("command")
+
+        if command not in client.SERVED_COMMANDS:
+            raise ValueError(f"Command {command} is not served by daemon")
+
+        if command == "dash" and self._dashboard is not None \
+                and monotonic() - self._dashboard_time <= self.refresh_interval * 2:
+            # Snapshot keeps raw values, they are rendered only for display
+            return self._dashboard if request.get("raw") else commands.format_dashboard(self._dashboard)
+
+        if command == "update" and request.get("action") == "check":
+            # Keep cache fresh on schedule and answer from it right away
+            updates.get_checker().start(request.get("password", ""))
+            request = dict(request, background=True)
+
+        return handle_request(request)
+
+    def serve_forever(self) -> None:
+        """serve_forever Function to run daemon until shutdown is called
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+        self._server.daemon = self
+
+        get_cpu_sampler()
+        get_disk_io_sampler()
+        get_net_io_sampler()
+        get_tcp_state_sampler()
+        get_thermal_sampler()
+        recorder = tsdb.Recorder(commands.get_history_store(), commands.get_history_sources(),
+                                 self.record_interval).start()
+        metrics = None
+        if self.metrics_port:
+            metrics = exporter.Exporter(commands.get_metric_families, self.metrics_port).start()
+        threading.Thread(target=self._refresh_loop, name="dashboard-refresh", daemon=True).start()
+        logger.warning("Daemon listening on %s", self.socket_path)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stop.set()
+            recorder.stop()
+            updates.get_checker().stop()
+            if metrics is not None:
+                metrics.stop()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self) -> None:
+        """shutdown Function to stop serving, must be called from another thread
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
@@ -0,0 +1,431 @@
+""" Docker Engine API client over Unix socket
+
+Talks HTTP/1.1 directly to dockerd, keeping one keep-alive connection per
+client, so container queries need neither sudo nor docker CLI processes.
+"""
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Optional
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_WORKERS = 16
+
+
+def _default_socket() -> str:
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return "/var/run/docker.sock"
+
+
+DEFAULT_SOCKET = _default_socket()
+
+# Error of unknown container, docker CLI prints daemon message as is
+NO_SUCH_CONTAINER = re.compile(r"No such container: (\S+)")
+
+
+class DockerError(Exception):
+    """DockerError Docker Engine answered with error status
+
+    Args:
+        status (int): HTTP status code
+        message (str): error message from daemon
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DockerClient:
+    """DockerClient Docker Engine API client reusing one connection
+
+    Args:
+        socket_path (str): dockerd Unix socket path
+        timeout (float): socket timeout in seconds
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pool = []
+        self._pool_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """is_available Function to check if current user can use docker socket
+
+        Returns:
+            bool: True if socket exists and is readable and writable
+        """
+        return os.path.exists(self.socket_path) and os.access(self.socket_path, os.R_OK | os.W_OK)
+
+    def connect(self, timeout: Optional[float] = DEFAULT_TIMEOUT) -> http.client.HTTPConnection:
+        """connect Function to open new dedicated connection, used for streaming
+
+        Args:
+            timeout (float, optional): socket timeout in seconds
+
+        Returns:
+            HTTPConnection: connection to dockerd
+        """
+        return _UnixHTTPConnection(self.socket_path, timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+
+        for client in pool:
+            client.close()
+
+    def _borrow(self) -> "DockerClient":
+        with self._pool_lock:
+            if self._pool:
+                return self._pool.pop()
+
+        return DockerClient(self.socket_path, self.timeout)
+
+    def _release(self, client: "DockerClient") -> None:
+        with self._pool_lock:
+            if len(self._pool) < DEFAULT_WORKERS:
+                self._pool.append(client)
+                return
+
+        client.close()
+
+    def _send(self, method: str, url: str, body: Optional[bytes]) -> tuple[int, bytes]:
+        if self._conn is None:
+            self._conn = self.connect(self.timeout)
+
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self._conn.request(method, url, body=body, headers=headers)
+        response = self._conn.getresponse()
+        data = response.read()
+
+        if response.will_close:
+            self._conn.close()
+            self._conn = None
+
+        return response.status, data
+
+    def request(self, method: str, path: str, query: Optional[dict] = None, body: Optional[dict] = None):
+        """request Function to call Engine API endpoint
+
+        Args:
+            method (str): HTTP method
+            path (str): endpoint path, e.g. /containers/json
+            query (dict, optional): query parameters
+            body (dict, optional): JSON body
+
+        Raises:
+            DockerError: daemon answered with status >= 400
+            OSError: daemon is not reachable
+
+        Returns:
+            tuple[int, Any]: status and decoded JSON answer, None for empty answer
+        """
+        url = path
+        if query:
+            url += "?" + urlencode(query)
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+
+        with self._lock:
+            try:
+                status, data = self._send(method, url, payload)
+            except (http.client.HTTPException, ConnectionError, BrokenPipeError) as err:
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                if method != "GET":
+                    # Daemon may have acted on request already, repeating it could run action twice
+                    raise ConnectionError(f"Docker {method} {path} failed: {err}") from err
+                # Keep-alive connection closed by daemon, retry once on fresh one
+                status, data = self._send(method, url, payload)
+
+        decoded = json.loads(data) if data else None
+
+        if status >= 400:
+            message = decoded.get("message", "") if isinstance(decoded, dict) else str(decoded)
+            logger.error("Docker %s %s failed: %s %s", method, path, status, message)
+            raise DockerError(status, message)
+
+        return status, decoded
+
+    def containers(self, all: bool = True, filters: Optional[dict] = None) -> list:
+        """containers Function to list containers
+
+        Args:
+            all (bool): include stopped containers
+            filters (dict, optional): Engine API filters, e.g. {"name": ["web"]}
+
+        Returns:
+            list: container summaries as returned by /containers/json
+        """
+        query = {"all": "1" if all else "0"}
+        if filters:
+            query["filters"] = json.dumps(filters)
+        return self.request("GET", "/containers/json", query)[1]
+
+    def inspect(self, container: str) -> dict:
+        """inspect Function to get low level container information
+
+        Args:
+            container (str): container name or id
+
+        Returns:
+            dict: inspect document
+        """
+        return self.request("GET", f"/containers/{quote(container)}/json")[1]
+
+    def stats(self, container: str) -> dict:
+        """stats Function to get single stats document of container
+
+        Args:
+            container (str): container name or id
+
+        Returns:
+            dict: stats document with precpu_stats filled in
+        """
+        return self.request("GET", f"/containers/{quote(container)}/stats", {"stream": "0"})[1]
+
+    def stats_many(self, containers: list, workers: int = DEFAULT_WORKERS) -> dict:
+        """stats_many Function to get stats of several containers at once
+
+        Containers are queried in parallel over pooled connections, which
+        stay open for next batch, so the call takes about as long as single
+        stats request.
+
+        Args:
+            containers (list): container names or ids
+            workers (int): max parallel requests
+
+        Returns:
+            dict: container -> stats document, containers that failed are left out
+        """
+        def fetch(container: str) -> dict:
+            client = self._borrow()
+            try:
+                return client.stats(container)
+            finally:
+                self._release(client)
+
+        ret = dict()
+
+        if not containers:
+            return ret
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(containers))) as executor:
+            futures = {container: executor.submit(fetch, container) for container in containers}
+
+            for container, future in futures.items():
+                try:
+                    ret[container] = future.result()
+                except (DockerError, OSError) as err:
+                    logger.error("Docker stats %s failed: %s", container, err)
+
+        return ret
+
+    def _lifecycle(self, action: str, container: str, timeout: Optional[int]) -> bool:
+        query = {"t": str(timeout)} if timeout is not None else None
+        status, _ = self.request("POST", f"/containers/{quote(container)}/{action}", query)
+        # 304 means container already was in requested state
+        return status in (204, 304)
+
+    def start(self, container: str) -> bool:
+        return self._lifecycle("start", container, None)
+
+    def stop(self, container: str, timeout: Optional[int] = None) -> bool:
+        return self._lifecycle("stop", container, timeout)
+
+    def restart(self, container: str, timeout: Optional[int] = None) -> bool:
+        return self._lifecycle("restart", container, timeout)
+
+
+def container_name(summary: dict) -> str:
+    """container_name Function to get container name from list or inspect document
+
+    Args:
+        summary (dict): /containers/json item or inspect document
+
+    Returns:
+        str: name without leading slash
+    """
+    if "Names" in summary and summary["Names"]:
+        return summary["Names"][0].lstrip("/")
+    return summary.get("Name", "").lstrip("/")
+
+
+def human_duration(seconds: float) -> str:
+    """human_duration Function to format duration like docker CLI does
+
+    Args:
+        seconds (float): duration in seconds
+
+    Returns:
+        str: duration, e.g. "3 hours"
+    """
+    if seconds < 1:
+        return "Less than a second"
+    if seconds < 2:
+        return "1 second"
+    if seconds < 60:
+        return f"{int(seconds)} seconds"
+
+    minutes = int(seconds / 60)
+    if minutes == 1:
+        return "About a minute"
+    if minutes < 60:
+        return f"{minutes} minutes"
+
+    hours = int(seconds / 3600 + 0.5)
+    if hours == 1:
+        return "About an hour"
+    if hours < 48:
+        return f"{hours} hours"
+    if hours < 24 * 7 * 2:
+        return f"{hours // 24} days"
+    if hours < 24 * 30 * 2:
+        return f"{hours // (24 * 7)} weeks"
+    if hours < 24 * 365 * 2:
+        return f"{hours // (24 * 30)} months"
+
+    return f"{hours // (24 * 365)} years"
+
+
+def running_for(summary: dict) -> str:
+    """running_for Function to format container age like {{.RunningFor}}
+
+    Args:
+        summary (dict): /containers/json item
+
+    Returns:
+        str: age, e.g. "3 hours ago"
+    """
+    return f"{human_duration(time() - summary.get('Created', time()))} ago"
+
+
+def parse_stats(stats: dict) -> dict:
+    """parse_stats Function to reduce stats document to raw numbers
+
+    Memory excludes page cache the same way docker stats does.
+
+    Args:
+        stats (dict): stats document
+
+    Returns:
+        dict: name, cpu (percent), mem_used, mem_limit, net_rx, net_tx,
+            block_read, block_write (bytes)
+    """
+    cpu = stats.get("cpu_stats", {})
+    precpu = stats.get("precpu_stats", {})
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    cpu_percent = cpu_delta / system_delta * online * 100 if system_delta > 0 and cpu_delta > 0 else 0.0
+
+    memory = stats.get("memory_stats", {})
+    memory_detail = memory.get("stats", {})
+    # cgroup v1 reports "total_inactive_file", cgroup v2 "inactive_file"
+    cache = memory_detail.get("total_inactive_file", memory_detail.get("inactive_file", 0))
+    mem_used = max(memory.get("usage", 0) - cache, 0)
+
+    net_rx = net_tx = 0
+    for interface in (stats.get("networks") or {}).values():
+        net_rx += interface.get("rx_bytes", 0)
+        net_tx += interface.get("tx_bytes", 0)
+
+    block_read = block_write = 0
+    for entry in (stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []):
+        operation = entry.get("op", "").lower()
+        if operation == "read":
+            block_read += entry.get("value", 0)
+        elif operation == "write":
+            block_write += entry.get("value", 0)
+
+    return {
+        "name": stats.get("name", "").lstrip("/"),
+        "cpu": round(cpu_percent, 2),
+        "mem_used": mem_used,
+        "mem_limit": memory.get("limit", 0),
+        "net_rx": net_rx,
+        "net_tx": net_tx,
+        "block_read": block_read,
+        "block_write": block_write,
+    }
+
+
+def _human_size(size: float, binary: bool) -> str:
+    base = 1024.0 if binary else 1000.0
+    units = ["B", "KiB", "MiB", "GiB", "TiB"] if binary else ["B", "kB", "MB", "GB", "TB"]
+
+    for unit in units[:-1]:
+        if abs(size) < base:
+            return f"{size:.4g}{unit}"
+        size /= base
+
+    return f"{size:.4g}{units[-1]}"
+
+
+def format_stats(parsed: dict) -> dict:
+    """format_stats Function to format parsed stats like docker stats table
+
+    Args:
+        parsed (dict): output of parse_stats
+
+    Returns:
+        dict: name, cpu, ram, net_io, disk_io strings
+    """
+    return {
+        "name": parsed["name"],
+        "cpu": f"{parsed['cpu']:.2f}%",
+        "ram": f"{_human_size(parsed['mem_used'], True)} / {_human_size(parsed['mem_limit'], True)}",
+        "net_io": f"{_human_size(parsed['net_rx'], False)} / {_human_size(parsed['net_tx'], False)}",
+        "disk_io": f"{_human_size(parsed['block_read'], False)} / {_human_size(parsed['block_write'], False)}",
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DockerClient:
+    """get_client Function to get shared client for default docker socket
+
+    Returns:
+        DockerClient: client keeping its connection open between calls
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = DockerClient()
+        return _client
@@ -0,0 +1,172 @@
+""" Installed package inventory read from dpkg status database
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_STATUS = "/var/lib/dpkg/status"
+
+_FIELDS = (b"Package", b"Status", b"Version", b"Architecture")
+
+
+def parse_status(path: str) -> list:
+    """parse_status Function to stream parse dpkg status file
+
+    Only Package, Status, Version and Architecture fields are kept.
+
+    Args:
+        path (str): status file path
+
+    Returns:
+        list: dicts with package, status, version and architecture
+    """
+    ret = []
+    entry = dict()
+
+    with open(path, "rb") as file:
+        for line in file:
+            if line in (b"\n", b"\r\n"):
+                if entry:
+                    ret.append(entry)
+                    entry = dict()
+                continue
+
+            # Continuation lines of multi line fields start with whitespace
+            if line[:1] in (b" ", b"\t"):
+                continue
+
+            key, _, value = line.partition(b":")
+            if key in _FIELDS:
+                entry[key.decode("ascii").lower()] = value.strip().decode("utf-8", "replace")
+
+    if entry:
+        ret.append(entry)
+
+    return [{
+        "package": item.get("package", ""),
+        "status": item.get("status", ""),
+        "version": item.get("version", ""),
+        "architecture": item.get("architecture", ""),
+    } for item in ret if "package" in item]
+
+
+def _is_installed(status: str) -> bool:
+    """_is_installed Function to check if status is the one dpkg -l shows as ii
+    """
+    parts = status.split()
+    return len(parts) == 3 and parts[0] == "install" and parts[2] == "installed"
+
+
+class PackageInventory:
+    """PackageInventory Installed packages cached until dpkg status file changes
+
+    Args:
+        status_path (str): dpkg status file, fixture file can be used in tests
+    """
+
+    def __init__(self, status_path: str = DEFAULT_STATUS):
+        self.status_path = status_path
+        self._key = None
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def entries(self) -> list:
+        """entries Function to get parsed status entries, reparsed only when file changed
+
+        Returns:
+            list: dicts with package, status, version and architecture
+        """
+        try:
+            stat = os.stat(self.status_path)
+        except OSError as err:
+            logger.error("Cannot read %s: %s", self.status_path, err)
+            return []
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if key != self._key:
+                self._entries = parse_status(self.status_path)
+                self._key = key
+                logger.debug("Parsed %s, %s entries", self.status_path, len(self._entries))
+            return self._entries
+
+    def installed(self) -> list:
+        """installed Function to get fully installed packages
+
+        Returns:
+            list: entries with ii state
+        """
+        return [entry for entry in self.entries() if _is_installed(entry["status"])]
+
+    def count(self) -> int:
+        """count Function to count installed packages, same as dpkg -l | grep -c '^ii'
+
+        Returns:
+            int: installed package count
+        """
+        return len(self.installed())
+
+    def versions(self) -> dict:
+        """versions Function to get installed version per package
+
+        Returns:
+            dict: package -> version, foreign architecture packages as package:arch
+        """
+        ret = dict()
+
+        for entry in self.installed():
+            name = entry["package"]
+            if name in ret:
+                name = f"{name}:{entry['architecture']}"
+            ret[name] = entry["version"]
+
+        return ret
+
+    def diff(self, upgradable: list) -> list:
+        """diff Function to compare upgradable list with installed versions
+
+        Args:
+            upgradable (list): "package/suite: old -> new" strings from update check
+
+        Returns:
+            list: dicts with package, installed, available and current, current
+                is False when dpkg already has different version than update check saw
+        """
+        versions = self.versions()
+        ret = []
+
+        for item in upgradable:
+            name_part, _, change = item.partition(": ")
+            old, _, new = change.partition(" -> ")
+            name = name_part.split("/")[0]
+            installed = versions.get(name)
+
+            ret.append({
+                "package": name,
+                "installed": installed,
+                "available": new,
+                "current": installed == old,
+            })
+
+        return ret
+
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory() -> PackageInventory:
+    """get_inventory Function to get shared inventory of system dpkg database
+
+    Returns:
+        PackageInventory: inventory
+    """
+    global _inventory
+
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = PackageInventory()
+        return _inventory
@@ -0,0 +1,171 @@
+""" OpenMetrics exporter serving pre-rendered snapshot of collectors
+
+Background thread collects all metric families at fixed cadence and
+renders them once, scrapes only copy finished bytes.
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_INTERVAL = 15.0
+PREFIX = "copilot_"
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Family(NamedTuple):
+    """Family Metric family with its samples
+
+    samples are (labels dict, value) pairs.
+    """
+    name: str
+    type: str
+    help: str
+    samples: list
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(families: list, openmetrics: bool = True) -> bytes:
+    """render Function to render metric families in exposition format
+
+    Args:
+        families (list): list of Family
+        openmetrics (bool): OpenMetrics format, else Prometheus text format 0.0.4
+
+    Returns:
+        bytes: exposition body
+    """
+    lines = []
+
+    for family in families:
+        name = PREFIX + family.name
+        # Counter samples carry _total suffix, OpenMetrics family name does not
+        sample_name = f"{name}_total" if family.type == "counter" else name
+        # Text format 0.0.4 metadata names the samples themselves
+        meta_name = name if openmetrics else sample_name
+
+        lines.append(f"# TYPE {meta_name} {family.type}")
+        lines.append(f"# HELP {meta_name} {family.help}")
+
+        for labels, value in family.samples:
+            if value is None:
+                continue
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+
+    if openmetrics:
+        lines.append("# EOF")
+
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        logger.debug("Exporter %s", format % args)
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.exporter.snapshot(openmetrics)
+
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else TEXT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Exporter:
+    """Exporter HTTP endpoint for scrapes with background snapshot refresh
+
+    Args:
+        collect (Callable): returns list of Family
+        port (int): TCP port
+        host (str): address to bind
+        interval (float): seconds between snapshot refreshes
+    """
+
+    def __init__(self, collect: Callable, port: int, host: str = DEFAULT_HOST, interval: float = DEFAULT_INTERVAL):
+        self.collect = collect
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self._bodies = (render([]), render([], False))
+        self._stop = threading.Event()
+        self._server = None
+
+    def refresh(self) -> None:
+        """refresh Function to collect families and render new snapshot
+        """
+        start = monotonic()
+
+        try:
+            families = list(self.collect())
+        except Exception as err:
+            logger.error("Metrics collection failed: %s", err)
+            return
+
+        families.append(Family("scrape_collect_seconds", "gauge", "Time spent collecting last snapshot",
+                               [({}, round(monotonic() - start, 6))]))
+        self._bodies = (render(families), render(families, False))
+
+    def snapshot(self, openmetrics: bool = True) -> bytes:
+        """snapshot Function to get last rendered body
+
+        Args:
+            openmetrics (bool): OpenMetrics format, else Prometheus text format
+
+        Returns:
+            bytes: exposition body
+        """
+        return self._bodies[0] if openmetrics else self._bodies[1]
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def start(self) -> "Exporter":
+        """start Function to start refresh thread and HTTP server in background
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.exporter = self
+
+        threading.Thread(target=self._loop, name="exporter-refresh", daemon=True).start()
+        threading.Thread(target=self._server.serve_forever, name="exporter-http", daemon=True).start()
+        logger.warning("Exporter listening on %s:%s", self.host, self.port)
+
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
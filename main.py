@@ -1,108 +1,287 @@
-import logging
-import logging.config
 from os import path
-import commands
-import json
+import importlib.util
+import signal
+import sys
+import time
+import client
+import output
+import watch
 
 import argparse
 
-def main():
+_logger = None
+
+def setup_logging():
+    # Imported here so thin client queries skip logging setup entirely
+    global _logger
+    if _logger is not None:
+        # Watch and follow loops execute requests every tick, configure only once
+        return _logger
+    import logging
+    import logging.config
     log_file_path = path.join(path.dirname(path.abspath(__file__)), 'log.conf')
     logging.config.fileConfig(log_file_path, disable_existing_loggers=True)
-    logger = logging.getLogger('copilotLogger')
-    
+    _logger = logging.getLogger('copilotLogger')
+    return _logger
+
+def execute(request: dict, socket_path: str, local: bool):
+    """execute Function to run request through daemon if it is running, else in process
+
+    Args:
+        request (dict): request, see daemon.handle_request
+        socket_path (str): daemon socket path
+        local (bool): never use daemon
+
+    Returns:
+        Any: request result, False on failure
+    """
+    if not local and request["command"] in client.SERVED_COMMANDS and client.is_available(socket_path):
+        try:
+            return client.query(request, socket_path)
+        except client.DaemonError:
+            return False
+        except OSError:
+            pass
+
+    setup_logging()
+    import daemon
+    try:
+        return daemon.handle_request(request)
+    except ValueError:
+        return False
+
+def is_bulk(args) -> bool:
+    """is_bulk Function to check if docker lifecycle action targets more than one named container
+
+    Args:
+        args (Namespace): parsed command line arguments
+
+    Returns:
+        bool: True if bulk selectors or options are used
+    """
+    import bulk
+
+    if args.group or args.label or args.concurrency is not None:
+        return True
+
+    selectors = bulk.parse_selectors(args.container or "")
+
+    return len(selectors) > 1 or bulk.needs_listing(selectors)
+
+def command_is_stream(request: dict, args) -> bool:
+    """command_is_stream Function to check if request prints progress events while running
+    """
+    return request["command"] == "update" and request.get("action") == "run" and args.stream
+
+def build_request(args) -> dict:
+    """build_request Function to translate parsed arguments into request
+
+    Args:
+        args (Namespace): parsed command line arguments
+
+    Returns:
+        dict: request or None if arguments are incomplete
+    """
+    command = args.command
+
+    if command in ("reboot", "shutdown"):
+        if args.password != "":
+            return {"command": command, "password": args.password}
+
+    elif command == "procs":
+        return {"command": command, "count": args.top, "sort": args.sort}
+
+    elif command == "history":
+        return {"command": command, "metric": args.metric, "since": args.since, "tier": args.tier}
+
+    elif command == "sensors":
+        return {"command": command}
+
+    elif command == "thermal":
+        since = time.time() - args.since if args.since is not None else None
+        return {"command": command, "window": args.window, "since": since}
+
+    elif command in ("disks", "net"):
+        return {"command": command, "window": args.window}
+
+    elif command == "packages":
+        return {"command": command, "versions": args.versions, "diff": args.diff}
+
+    elif command == "update":
+        if args.password != "" and args.action in ("check", "run"):
+            return {"command": command, "action": args.action, "password": args.password}
+
+    elif command == "docker":
+        if args.password != "" and args.docker_action != "":
+            if args.docker_action == "show":
+                return {"command": command, "action": args.docker_action, "password": args.password}
+            elif args.docker_action in ("start", "stop", "restart") and is_bulk(args):
+                import bulk
+                groups = [bulk.parse_selectors(group) for group in args.group or []]
+                selectors = bulk.parse_selectors(args.container or "")
+                selectors += [f"{bulk.LABEL_PREFIX}{label}" for label in args.label or []]
+                if selectors:
+                    groups.append(selectors)
+                return {"command": command, "action": "bulk", "operation": args.docker_action,
+                        "password": args.password, "groups": groups,
+                        "concurrency": args.concurrency or bulk.DEFAULT_CONCURRENCY}
+            elif args.docker_action == "stats" and args.docker_watch:
+                containers = [name for name in (args.container or "").split(",") if name]
+                return {"command": command, "action": "latest", "password": args.password,
+                        "container": containers or None}
+            elif args.docker_action in ("start", "stop", "restart", "stats"):
+                if args.container:
+                    container = args.container
+                    if args.docker_action == "stats" and args.follow:
+                        return {"command": command, "action": "feed", "password": args.password,
+                                "container": [name for name in container.split(",") if name],
+                                "window": args.window}
+                    if args.docker_action == "stats" and "," in container:
+                        container = [name for name in container.split(",") if name]
+                    return {"command": command, "action": args.docker_action,
+                            "password": args.password, "container": container}
+
+    return None
+
+def main():
     sudoPassword: str = ""
-    
+
     parser = argparse.ArgumentParser(description="This is simple command line python script to help you manage your server")
-    
+
     parser.add_argument("--dash", help="Show basic server statistics", action="store_true")
-    
+    parser.add_argument("--raw", help="With --dash, show numbers in base units instead of human readable text", action="store_true")
+    parser.add_argument("--watch", help="With --dash, keep running and show statistics every INTERVAL seconds", type=float, metavar="INTERVAL")
+    parser.add_argument("--delta", help="With --watch, after first output show only fields that changed", action="store_true")
+    parser.add_argument("--stats", help="Show cache and command timing statistics with cpu usage over 1s, 10s and 60s", action="store_true")
+    parser.add_argument("--daemon", help="Run as daemon serving queries on unix socket", action="store_true")
+    parser.add_argument("--socket", help="Daemon unix socket path", type=str, default=client.DEFAULT_SOCKET)
+    parser.add_argument("--metrics-port", help="Serve OpenMetrics endpoint on this local port", type=int)
+    parser.add_argument("--format", help="Output format, msgpack needs msgpack package", choices=output.FORMATS, default=output.DEFAULT_FORMAT)
+    parser.add_argument("--local", help="Do not use running daemon", action="store_true")
+
     subparsers = parser.add_subparsers(title='subcommands', dest='command')
-    
+
     sub_reboot = subparsers.add_parser("reboot", help="perform system reboot")
     sub_reboot.add_argument("password", help="sudo password, required for reboot command", type=str)
-    
+
     sub_shutdown = subparsers.add_parser("shutdown", help="perform system reboot")
     sub_shutdown.add_argument("password", help="sudo password, required for shutdown command", type=str)
-    
+
     sub_update = subparsers.add_parser("update", help="System update")
     sub_update.add_argument("action", help="check or perform", type=str)
+    sub_update.add_argument("--stream", help="With run, print progress events as they happen", action="store_true")
     sub_update.add_argument("password", help="sudo password, required for update command", type=str)
-    
+
+    sub_procs = subparsers.add_parser("procs", help="Show processes with highest usage")
+    sub_procs.add_argument("--top", help="Number of processes", type=int, default=5)
+    sub_procs.add_argument("--sort", help="Sort key", choices=["cpu", "rss", "io", "fds"], default="cpu")
+
+    sub_history = subparsers.add_parser("history", help="Show recorded metric history, daemon records it")
+    sub_history.add_argument("metric", help="Metric name, lists stored metrics if omitted", type=str, nargs="?")
+    sub_history.add_argument("--since", help="Range length, e.g. 15m, 6h, 7d", type=str, default="1h")
+    sub_history.add_argument("--tier", help="Storage tier", choices=["raw", "1m", "1h"])
+
+    sub_packages = subparsers.add_parser("packages", help="Show installed packages")
+    sub_packages.add_argument("--versions", help="Include installed version of every package", action="store_true")
+    sub_packages.add_argument("--diff", help="Compare last update check with installed versions", action="store_true")
+
+    sub_disks = subparsers.add_parser("disks", help="Show usage of all mounts and I/O of their devices")
+    sub_disks.add_argument("--window", help="Seconds I/O rates are averaged over", type=float, default=1.0)
+
+    sub_net = subparsers.add_parser("net", help="Show interface traffic and tcp connection states")
+    sub_net.add_argument("--window", help="Seconds traffic rates are averaged over", type=float, default=1.0)
+
+    subparsers.add_parser("sensors", help="Show all temperature sensors")
+
+    sub_thermal = subparsers.add_parser("thermal", help="Show cpu frequency and temperature history with throttling episodes, daemon records it")
+    sub_thermal.add_argument("--window", help="Seconds of history to aggregate", type=float, default=60.0)
+    sub_thermal.add_argument("--since", help="Only episodes from last SECONDS", type=float)
+
     sub_docker = subparsers.add_parser("docker", help="docker commands")
     sub_docker.add_argument("docker_action", help="action to call", type=str)
-    sub_docker.add_argument("--container", help="Container to modify", type=str)
+    sub_docker.add_argument("--container", help="Container to modify, comma separated names, globs or label:KEY[=VALUE]", type=str)
+    sub_docker.add_argument("--label", help="Select containers by label KEY[=VALUE], may repeat", action="append")
+    sub_docker.add_argument("--group", help="Ordered group of selectors run before later groups, may repeat", action="append")
+    sub_docker.add_argument("--concurrency", help="Max parallel container operations", type=int)
+    sub_docker.add_argument("--follow", help="Keep streaming stats and print rolling aggregates", action="store_true")
+    sub_docker.add_argument("--window", help="Seconds aggregated by --follow", type=float, default=60.0)
+    sub_docker.add_argument("--watch", help="Keep running and print newest stats sample of containers, running ones if --container is not given", action="store_true", dest="docker_watch")
+    sub_docker.add_argument("--delta", help="With --watch, after first output show only fields that changed", action="store_true", dest="docker_delta")
+    sub_docker.add_argument("--interval", help="Seconds between --follow and --watch outputs", type=float, default=5.0)
     sub_docker.add_argument("password", help="sudo password, required for docker command", type=str)
-        
-    
+
+
     args = parser.parse_args()
-    
+
+    if args.format == "msgpack" and importlib.util.find_spec("msgpack") is None:
+        parser.error("msgpack output needs msgpack package, pip install msgpack")
+
+    if args.daemon:
+        setup_logging()
+        import daemon
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            daemon.Daemon(args.socket, metrics_port=args.metrics_port).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.metrics_port:
+        setup_logging()
+        import commands
+        import exporter
+        metrics = exporter.Exporter(commands.get_metric_families, args.metrics_port).start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            signal.pause()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            metrics.stop()
+        return
+
+    writer = output.Writer(args.format)
+
+    if args.dash and args.watch:
+        request = {"command": "dash", "raw": args.raw, "watch": True}
+        watch.run(lambda: execute(request, args.socket, args.local), writer.write, args.watch, args.delta)
+        return
+
     if args.dash:
-        print(json.dumps(commands.refresh_dashboard()))
-                       
+        writer.write(execute({"command": "dash", "raw": args.raw}, args.socket, args.local))
+
+    if args.stats:
+        writer.write(execute({"command": "stats"}, args.socket, args.local))
+
     if args.command:
-        command = args.command
-        
-        if command == "reboot":
-            if args.password != "":
-                print(commands.execute_system_reboot(args.password))
-            else:
-                print(False)
-                
-        elif command == "shutdown":
-            if args.password != "":
-                print(commands.execute_system_shutdown(args.password))
-            else:
-                print(False)
-        
-        elif command == "update":
-            if args.password != "":
-                if args.action != "":
-                    if args.action == "check":
-                        ret = dict()
-                        ret["updates"] = commands.get_available_updates(args.password)
-                        print(json.dumps(ret))
-                    elif args.action == "run":
-                        print(commands.execute_available_updates(args.password))
-                    else:
-                        print(False)
-                else:
-                    print(False)
-            else:
-                print(False)
-                
-        elif command == "docker":
-            if args.password != "":
-                if args.docker_action != "":
-                    if args.docker_action == "show":
-                        print(commands.get_docker_containers(args.password))
-                    elif args.docker_action == "start":
-                        if args.container != "":
-                            print(commands.execute_container_start(args.password, args.container))
-                        else:
-                            print(False)
-                    elif args.docker_action == "stop":
-                        if args.container != "":
-                            print(commands.execute_container_stop(args.password, args.container))
-                        else:
-                            print(False)
-                    elif args.docker_action == "restart":
-                        if args.container != "":
-                            print(commands.execute_container_restart(args.password, args.container))
-                        else:
-                            print(False)
-                    elif args.docker_action == "stats":
-                        if args.container != "":
-                            print(commands.get_container_stats(args.password, args.container))
-                        else:
-                            print(False)
-                    else:
-                        print(False)
-                else:
-                    print(False)
-            else:
-                print(False)
-            
+        request = build_request(args)
+
+        if request is None:
+            writer.write(False)
+            return
+
+        if command_is_stream(request, args):
+            setup_logging()
+            import commands
+            for event in commands.stream_available_updates(request["password"]):
+                writer.write(event)
+            return
+
+        if request.get("action") == "latest":
+            watch.run(lambda: execute(request, args.socket, args.local), writer.write, args.interval, args.docker_delta)
+            return
+
+        if request.get("action") == "feed":
+            try:
+                while True:
+                    writer.write(execute(request, args.socket, args.local))
+                    time.sleep(args.interval)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        writer.write(execute(request, args.socket, args.local))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
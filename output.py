@@ -0,0 +1,108 @@
+""" Output encoding of command results, single place where results are serialised
+
+Formats:
+    json     one JSON document per result
+    ndjson   one compact JSON document per line, flushed after each one
+    msgpack  concatenated MessagePack objects, needs optional msgpack package
+    text     indented "key: value" lines for reading in terminal
+"""
+import json
+import sys
+
+FORMATS = ("json", "ndjson", "msgpack", "text")
+DEFAULT_FORMAT = "json"
+
+
+def _text_lines(value, indent: int = 0) -> list:
+    prefix = "  " * indent
+
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{prefix}{key}:")
+                lines.extend(_text_lines(item, indent + 1))
+            else:
+                lines.append(f"{prefix}{key}: {_text_scalar(item)}")
+        return lines
+
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            if isinstance(item, (dict, list)) and item:
+                nested = _text_lines(item, indent + 1)
+                lines.append(f"{prefix}- {nested[0].lstrip()}")
+                lines.extend(nested[1:])
+            else:
+                lines.append(f"{prefix}- {_text_scalar(item)}")
+        return lines
+
+    return [f"{prefix}{_text_scalar(value)}"]
+
+
+def _text_scalar(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (dict, list)):
+        return "{}" if isinstance(value, dict) else "[]"
+    return str(value)
+
+
+def encode(value, format: str = DEFAULT_FORMAT) -> bytes:
+    """encode Function to serialise one result
+
+    Args:
+        value (Any): result made of dicts, lists, strings, numbers, booleans and None
+        format (str): json, ndjson, msgpack or text
+
+    Raises:
+        ValueError: unknown format
+        RuntimeError: msgpack format without msgpack package
+
+    Returns:
+        bytes: encoded result, text formats end with newline
+    """
+    if format == "json":
+        return (json.dumps(value) + "\n").encode("utf-8")
+
+    if format == "ndjson":
+        return (json.dumps(value, separators=(",", ":")) + "\n").encode("utf-8")
+
+    if format == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("msgpack output needs msgpack package, pip install msgpack")
+        return msgpack.packb(value, use_bin_type=True)
+
+    if format == "text":
+        return ("\n".join(_text_lines(value)) + "\n").encode("utf-8")
+
+    raise ValueError(f"Unknown output format: {format}")
+
+
+class Writer:
+    """Writer Encoder of results written to binary stream
+
+    Args:
+        format (str): json, ndjson, msgpack or text
+        stream (BinaryIO, optional): destination, stdout if not given
+    """
+
+    def __init__(self, format: str = DEFAULT_FORMAT, stream=None):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown output format: {format}")
+
+        self.format = format
+        self.stream = stream if stream is not None else sys.stdout.buffer
+
+    def write(self, value) -> None:
+        """write Function to encode and write one result, flushed so streams can be consumed live
+
+        Args:
+            value (Any): result
+        """
+        self.stream.write(encode(value, self.format))
+        self.stream.flush()
@@ -0,0 +1,154 @@
+""" Process ranking with incremental cpu and io deltas between samples
+"""
+import heapq
+import logging
+import threading
+from time import monotonic, sleep
+
+import psutil
+
+logger = logging.getLogger('copilotLogger')
+
+SORT_KEYS = ("cpu", "rss", "io", "fds")
+FIRST_SAMPLE_DELAY = 0.1
+
+_ATTRS = {
+    "cpu": [],
+    "rss": ["memory_info"],
+    "io": ["io_counters"],
+    "fds": ["num_fds"],
+}
+
+# Delta fields with their attribute, "cpu_times" is read by every scan
+_DELTAS = {
+    "cpu": "cpu_times",
+    "io": "io_counters",
+}
+
+
+class ProcessRanker:
+    """ProcessRanker Ranks processes by usage since previous sample
+
+    Keeps per process cpu and io totals from previous sample, keyed by pid
+    and create time so reused pids are not mixed up. Every scan reads cpu
+    times but only io scans read io counters, so each delta field keeps its
+    own baseline.
+    """
+
+    def __init__(self):
+        self._baselines = {field: (None, dict()) for field in _DELTAS}
+        self._lock = threading.Lock()
+
+    def _scan(self, key: str) -> tuple[float, dict]:
+        attrs = ["name", "create_time", "cpu_times", *_ATTRS[key]]
+        ret = dict()
+
+        for proc in psutil.process_iter(attrs):
+            info = proc.info
+            if info["cpu_times"] is None:
+                continue
+            ret[(proc.pid, info["create_time"])] = info
+
+        return monotonic(), ret
+
+    def sample(self, key: str = "cpu") -> list:
+        """sample Function to scan processes and compute usage since previous sample
+
+        Args:
+            key (str): ranking key, one of SORT_KEYS, decides which attributes are read
+
+        Returns:
+            list: dicts with pid, name, cpu (percent of one core), rss (bytes),
+                io (bytes/s read and written) and fds, unread values are None
+        """
+        if key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {key}")
+
+        fields = [field for field, attr in _DELTAS.items() if attr == "cpu_times" or attr in _ATTRS[key]]
+
+        with self._lock:
+            if key in _DELTAS and self._baselines[key][0] is None:
+                first = self._scan(key)
+                for field in fields:
+                    self._baselines[field] = first
+                sleep(FIRST_SAMPLE_DELAY)
+
+            now, current = self._scan(key)
+            baselines = dict(self._baselines)
+            for field in fields:
+                self._baselines[field] = (now, current)
+
+        elapsed = {field: now - baselines[field][0] if baselines[field][0] is not None else 0.0 for field in fields}
+        ret = []
+
+        for (pid, _), info in current.items():
+            times = info["cpu_times"]
+            cpu = None
+            io = None
+
+            if elapsed["cpu"] > 0:
+                # Processes started after previous sample count from zero
+                before = baselines["cpu"][1].get((pid, info["create_time"]))
+                cpu_before = before["cpu_times"].user + before["cpu_times"].system if before else 0.0
+                cpu = round((times.user + times.system - cpu_before) / elapsed["cpu"] * 100, 1)
+
+            counters = info.get("io_counters")
+            if counters is not None and elapsed.get("io", 0.0) > 0:
+                before = baselines["io"][1].get((pid, info["create_time"]))
+                io_before = 0
+                if before and before.get("io_counters") is not None:
+                    io_before = before["io_counters"].read_bytes + before["io_counters"].write_bytes
+                io = round((counters.read_bytes + counters.write_bytes - io_before) / elapsed["io"], 1)
+
+            memory = info.get("memory_info")
+
+            ret.append({
+                "pid": pid,
+                "name": info["name"],
+                "cpu": cpu,
+                "rss": memory.rss if memory is not None else None,
+                "io": io,
+                "fds": info.get("num_fds"),
+            })
+
+        return ret
+
+    def top(self, count: int = 5, key: str = "cpu") -> list:
+        """top Function to get processes with highest usage
+
+        Args:
+            count (int): number of processes
+            key (str): ranking key, one of SORT_KEYS
+
+        Returns:
+            list: process dicts ordered from highest usage, see sample
+        """
+        records = (record for record in self.sample(key) if record[key] is not None)
+        ret = heapq.nlargest(count, records, key=lambda record: record[key])
+
+        logger.debug("Top %s processes by %s: %s", count, key, ret)
+
+        return ret
+
+
+_rankers = dict()
+_rankers_lock = threading.Lock()
+
+
+def get_ranker(consumer: str = "procs") -> ProcessRanker:
+    """get_ranker Function to get process ranker of consumer
+
+    Every sample resets baseline of its ranker, so consumers polling at
+    different cadence keep own rankers and do not shorten each other's
+    measurement interval.
+
+    Args:
+        consumer (str): consumer name, e.g. "procs" or "dashboard"
+
+    Returns:
+        ProcessRanker: ranker keeping state between calls of consumer
+    """
+    with _rankers_lock:
+        if consumer not in _rankers:
+            _rankers[consumer] = ProcessRanker()
+        return _rankers[consumer]
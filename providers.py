@@ -0,0 +1,173 @@
+""" In-process providers of system facts, replacing shell helpers
+"""
+import glob
+import logging
+import os
+import re
+import socket
+from typing import NamedTuple
+
+import psutil
+
+from procrank import get_ranker
+
+logger = logging.getLogger('copilotLogger')
+
+TCP_TABLES = ("/proc/net/tcp", "/proc/net/tcp6")
+CPU_ROOT = "/sys/devices/system/cpu"
+
+# Connection state codes used in /proc/net/tcp, see include/net/tcp_states.h
+TCP_STATES = {
+    b"01": "ESTABLISHED",
+    b"02": "SYN_SENT",
+    b"03": "SYN_RECV",
+    b"04": "FIN_WAIT1",
+    b"05": "FIN_WAIT2",
+    b"06": "TIME_WAIT",
+    b"07": "CLOSE",
+    b"08": "CLOSE_WAIT",
+    b"09": "LAST_ACK",
+    b"0A": "LISTEN",
+    b"0B": "CLOSING",
+    b"0C": "NEW_SYN_RECV",
+}
+
+
+class CpuPolicy(NamedTuple):
+    """CpuPolicy Frequency of cpufreq policy, cpus sharing one clock
+    """
+    policy: int
+    cpus: tuple
+    current: float
+    max: float
+
+
+def _read_int(path: str):
+    try:
+        with open(path, "r") as file:
+            return int(file.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_cpus(path: str) -> tuple:
+    try:
+        with open(path, "r") as file:
+            return tuple(int(cpu) for cpu in file.read().split())
+    except (OSError, ValueError):
+        return ()
+
+
+def get_cpu_policies(root: str = CPU_ROOT) -> list:
+    """get_cpu_policies Function to read current and hardware max frequency of cpufreq policies
+
+    Max is cpuinfo_max_freq, unlike scaling_max_freq reported by psutil it
+    is not lowered by thermal cooling device, so throttling stays visible.
+
+    Args:
+        root (str): sysfs cpu directory, fixture tree can be used in tests
+
+    Returns:
+        list: CpuPolicy tuples in MHz ordered by policy, empty if cpufreq is not exposed
+    """
+    ret = []
+    policies = glob.glob(os.path.join(root, "cpufreq", "policy[0-9]*"))
+
+    if policies:
+        entries = [(int(re.search(r"(\d+)$", policy).group(1)), policy) for policy in policies]
+    else:
+        # Kernels before 4.3 expose cpufreq per cpu only
+        entries = [(int(re.search(r"cpu(\d+)/cpufreq$", policy).group(1)), policy)
+                   for policy in glob.glob(os.path.join(root, "cpu[0-9]*", "cpufreq"))]
+
+    for number, policy in sorted(entries):
+        current = _read_int(os.path.join(policy, "scaling_cur_freq"))
+        if current is None:
+            current = _read_int(os.path.join(policy, "cpuinfo_cur_freq"))
+        if current is None:
+            continue
+
+        cpus = _read_cpus(os.path.join(policy, "affected_cpus")) or _read_cpus(os.path.join(policy, "related_cpus")) \
+            or (number,)
+        ret.append(CpuPolicy(number, cpus, current / 1000, (_read_int(os.path.join(policy, "cpuinfo_max_freq")) or 0) / 1000))
+
+    return ret
+
+
+def get_kernel_version() -> str:
+    """get_kernel_version Function to get running kernel release, same as uname -r
+
+    Returns:
+        str: kernel release
+    """
+    return os.uname().release
+
+
+def get_hostname() -> str:
+    """get_hostname Function to get host name, same as hostname
+
+    Returns:
+        str: host name
+    """
+    return socket.gethostname()
+
+
+def get_local_ip() -> str:
+    """get_local_ip Function to get first non loopback ipv4 address, same as first word of hostname -I
+
+    Returns:
+        str: ipv4 address or None if host has none
+    """
+    stats = psutil.net_if_stats()
+
+    for name, addresses in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+
+        for address in addresses:
+            if address.family == socket.AF_INET and not address.address.startswith("127."):
+                return address.address
+
+    return None
+
+
+def get_tcp_states(tables: tuple = TCP_TABLES) -> dict:
+    """get_tcp_states Function to count tcp sockets by state, same as ss -tan | awk '{print $1}' | uniq -c
+
+    Tables are read directly, unlike psutil.net_connections no process is
+    resolved for sockets.
+
+    Args:
+        tables (tuple): /proc/net/tcp style files, missing ones are skipped
+
+    Returns:
+        dict: state name -> socket count, every state is present
+    """
+    counts = dict.fromkeys(TCP_STATES, 0)
+
+    for table in tables:
+        try:
+            with open(table, "rb") as file:
+                next(file, None)
+                for line in file:
+                    state = line.split(None, 4)[3]
+                    if state in counts:
+                        counts[state] += 1
+        except OSError as err:
+            logger.debug("Cannot read %s: %s", table, err)
+
+    return {TCP_STATES[code]: count for code, count in counts.items()}
+
+
+def get_top_process_by_cpu() -> str:
+    """get_top_process_by_cpu Function to get name of process using most cpu since previous call
+
+    Returns:
+        str: process name, empty if no process used cpu
+    """
+    top = get_ranker("dashboard").top(1, "cpu")
+
+    if top and top[0]["cpu"] > 0:
+        return top[0]["name"]
+
+    return ""
@@ -0,0 +1,198 @@
+""" Public IP resolution with long lived cache and fallback resolvers
+
+Resolvers are plain HTTP(S) endpoints answering with address as text body.
+They are tried in order under hard timeout. Failed attempts are rate
+limited and last known address keeps being served, marked as stale.
+"""
+import ipaddress
+import logging
+import os
+import threading
+import urllib.request
+from time import monotonic, time
+from typing import Optional
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_RESOLVERS = tuple(item.strip() for item in os.environ.get(
+    "COPILOT_IP_RESOLVERS", "https://ifconfig.me/ip,https://api.ipify.org,https://icanhazip.com").split(",")
+    if item.strip())
+DEFAULT_TTL = 3600.0
+DEFAULT_TIMEOUT = 3.0
+RETRY_INTERVAL = 60.0
+MAX_RESPONSE = 64
+
+
+def fetch(url: str, timeout: float) -> Optional[str]:
+    """fetch Function to ask single resolver for address
+
+    Args:
+        url (str): resolver endpoint
+        timeout (float): seconds for connect and read
+
+    Returns:
+        str: address, None if resolver failed or answered with something else
+    """
+    request = urllib.request.Request(url, headers={"User-Agent": "copilot", "Accept": "text/plain"})
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read(MAX_RESPONSE).decode("ascii", "replace").strip()
+        return str(ipaddress.ip_address(body))
+    except (OSError, ValueError) as err:
+        logger.debug("Resolver %s failed: %s", url, err)
+        return None
+
+
+class PublicIpResolver:
+    """PublicIpResolver Cached public address with background refresh
+
+    Args:
+        resolvers (tuple): endpoints tried in order, local stub can be used in tests
+        ttl (float): seconds address is considered fresh
+        timeout (float): total seconds one resolution may take
+        retry_interval (float): min seconds between attempts after failure
+    """
+
+    def __init__(self, resolvers: tuple = DEFAULT_RESOLVERS, ttl: float = DEFAULT_TTL,
+                 timeout: float = DEFAULT_TIMEOUT, retry_interval: float = RETRY_INTERVAL):
+        self.resolvers = tuple(resolvers)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._address = None
+        self._resolver = None
+        self._resolved = None
+        self._attempted = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._inflight = None
+
+    def resolve(self) -> tuple:
+        """resolve Function to try resolvers in order within timeout
+
+        Returns:
+            tuple: (address, resolver) or (None, None) if every resolver failed
+        """
+        deadline = monotonic() + self.timeout
+
+        for url in self.resolvers:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+
+            address = fetch(url, remaining)
+            if address is not None:
+                return address, url
+
+        return None, None
+
+    def refresh(self) -> Optional[str]:
+        """refresh Function to resolve address now, concurrent callers share one attempt
+
+        Returns:
+            str: resolved address, last known one if resolution failed
+        """
+        with self._lock:
+            if self._inflight is not None:
+                event = self._inflight
+                leader = False
+            else:
+                event = self._inflight = threading.Event()
+                self._attempted = monotonic()
+                leader = True
+
+        if not leader:
+            event.wait()
+            return self._address
+
+        try:
+            address, resolver = self.resolve()
+
+            with self._lock:
+                if address is not None:
+                    self._address, self._resolver, self._resolved = address, resolver, monotonic()
+                    self._error = None
+                else:
+                    self._error = "all resolvers failed"
+                    logger.error("Public IP resolution failed, serving %s", self._address)
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+
+        return self._address
+
+    def refresh_async(self) -> None:
+        """refresh_async Function to start refresh in background unless one is running
+        """
+        with self._lock:
+            if self._inflight is not None:
+                return
+
+        threading.Thread(target=self.refresh, name="public-ip", daemon=True).start()
+
+    def _due(self) -> bool:
+        if self._resolved is not None and monotonic() - self._resolved <= self.ttl:
+            return False
+        # Do not hammer resolvers while egress is down
+        return self._attempted is None or monotonic() - self._attempted >= self.retry_interval
+
+    @property
+    def stale(self) -> bool:
+        return self._resolved is None or monotonic() - self._resolved > self.ttl or self._error is not None
+
+    def get(self) -> Optional[str]:
+        """get Function to get cached address, refreshing when it expired
+
+        Only very first call waits for resolution, later refreshes run in
+        background and previous address is returned meanwhile.
+
+        Returns:
+            str: address, None if it was never resolved
+        """
+        if self._due():
+            if self._address is None and self._attempted is None:
+                return self.refresh()
+            self.refresh_async()
+
+        return self._address
+
+    def status(self) -> dict:
+        """status Function to get address with its origin and freshness
+
+        Returns:
+            dict: address, resolver, checked unix time, stale flag and last error
+        """
+        address = self.get()
+
+        with self._lock:
+            checked = None
+            if self._resolved is not None:
+                checked = round(time() - (monotonic() - self._resolved), 3)
+
+            return {
+                "address": address,
+                "resolver": self._resolver,
+                "checked": checked,
+                "stale": self.stale,
+                "error": self._error,
+            }
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> PublicIpResolver:
+    """get_resolver Function to get shared resolver
+
+    Returns:
+        PublicIpResolver: resolver using default endpoints
+    """
+    global _resolver
+
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = PublicIpResolver()
+        return _resolver
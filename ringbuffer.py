@@ -0,0 +1,139 @@
+""" Fixed size ring buffer of numeric rows backed by array module
+
+Rows are stored unboxed in one preallocated array next to array of their
+timestamps, so hour of per-second samples with eight fields takes about
+260 kB instead of megabytes of tuples and floats.
+"""
+from array import array
+from typing import Optional
+
+
+class RingBuffer:
+    """RingBuffer Fixed capacity series of timestamped numeric rows
+
+    Timestamps must be appended in non decreasing order.
+
+    Args:
+        width (int): values per row, 0 keeps timestamps only
+        capacity (int): rows kept, oldest are overwritten
+        typecode (str): array typecode of values, e.g. "d", "f" or "I"
+    """
+
+    __slots__ = ("width", "capacity", "_times", "_values", "_start", "_count")
+
+    def __init__(self, width: int, capacity: int, typecode: str = "d"):
+        self.width = width
+        self.capacity = max(1, capacity)
+        self._times = array("d", bytes(8 * self.capacity))
+        self._values = array(typecode, [0]) * (self.capacity * width)
+        self._start = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._times.itemsize * len(self._times) + self._values.itemsize * len(self._values)
+
+    def _slot(self, index: int) -> int:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("ring buffer index out of range")
+        return (self._start + index) % self.capacity
+
+    def append(self, timestamp: float, values) -> None:
+        """append Function to store row, overwriting oldest one when full
+
+        Args:
+            timestamp (float): row time
+            values (Sequence): width numbers
+        """
+        if self._count < self.capacity:
+            slot = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._times[slot] = timestamp
+        offset = slot * self.width
+        self._values[offset:offset + self.width] = array(self._values.typecode, values)
+
+    def clear(self) -> None:
+        self._start = 0
+        self._count = 0
+
+    def timestamp(self, index: int) -> float:
+        return self._times[self._slot(index)]
+
+    def row(self, index: int) -> tuple:
+        """row Function to get values of row, negative index counts from newest
+
+        Returns:
+            tuple: width numbers
+        """
+        offset = self._slot(index) * self.width
+        return tuple(self._values[offset:offset + self.width])
+
+    def bisect(self, timestamp: float) -> int:
+        """bisect Function to find first row not older than timestamp
+
+        Args:
+            timestamp (float): row time
+
+        Returns:
+            int: index of row, len(self) if every row is older
+        """
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[(self._start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def find(self, timestamp: float) -> Optional[tuple]:
+        """find Function to get row with exact timestamp
+
+        Args:
+            timestamp (float): row time
+
+        Returns:
+            tuple: row values, None if there is no such row
+        """
+        index = self.bisect(timestamp)
+
+        if index < self._count and self.timestamp(index) == timestamp:
+            return self.row(index)
+
+        return None
+
+    def rows(self, since: float = None) -> list:
+        """rows Function to get rows from since on, oldest first
+
+        Args:
+            since (float, optional): oldest row time, every row if not given
+
+        Returns:
+            list: (timestamp, values) pairs
+        """
+        start = 0 if since is None else self.bisect(since)
+        return [(self.timestamp(index), self.row(index)) for index in range(start, self._count)]
+
+    def column(self, field: int, since: float = None) -> list:
+        """column Function to get one value of each row from since on
+
+        Args:
+            field (int): value position in row
+            since (float, optional): oldest row time, every row if not given
+
+        Returns:
+            list: values, oldest first
+        """
+        start = 0 if since is None else self.bisect(since)
+        return [self._values[self._slot(index) * self.width + field] for index in range(start, self._count)]
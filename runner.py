@@ -0,0 +1,241 @@
+""" Shared subprocess runner for command wrappers
+"""
+import logging
+import subprocess as sproc
+import threading
+from time import monotonic
+from typing import Iterator, NamedTuple, Optional
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_TIMEOUT = 30.0
+
+_durations = dict()
+_durations_lock = threading.Lock()
+
+
+class CommandResult(NamedTuple):
+    """CommandResult Outcome of a finished command
+    """
+    command: list
+    returncode: int
+    stdout: str
+    stderr: str
+    duration: float
+    timed_out: bool
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+def _command_key(command: list) -> str:
+    """_command_key Function to build duration bucket name for a command
+
+    Args:
+        command (list): command arguments
+
+    Returns:
+        str: program name with its first argument, sudo prefix stripped
+    """
+    args = list(command)
+
+    if args and args[0] == "sudo":
+        args = [arg for arg in args[1:] if arg != "-S"]
+
+    return " ".join(args[:2])
+
+
+def _record_duration(command: list, duration: float) -> None:
+    key = _command_key(command)
+
+    with _durations_lock:
+        entry = _durations.setdefault(key, {"count": 0, "total": 0.0, "last": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += duration
+        entry["last"] = duration
+        entry["max"] = max(entry["max"], duration)
+
+    logger.debug("Command %s took %.3f s", key, duration)
+
+
+def get_command_durations() -> dict:
+    """get_command_durations Function to get per-command timing statistics
+
+    Returns:
+        dict: command name -> {count, total, last, max, avg} in seconds
+    """
+    ret = dict()
+
+    with _durations_lock:
+        for key, entry in _durations.items():
+            ret[key] = dict(entry)
+            ret[key]["avg"] = round(entry["total"] / entry["count"], 6)
+
+    return ret
+
+
+def run(command: list, input: Optional[str] = None, timeout: Optional[float] = DEFAULT_TIMEOUT) -> CommandResult:
+    """run Function to run command and wait for it without polling
+
+    Args:
+        command (list): command arguments
+        input (str, optional): data written to command stdin
+        timeout (float, optional): seconds after which command is killed, None waits forever
+
+    Returns:
+        CommandResult: return code, captured output and duration
+    """
+    start = monotonic()
+    timed_out = False
+
+    try:
+        proc = sproc.Popen(command,
+                           stdin=sproc.PIPE,
+                           stdout=sproc.PIPE,
+                           stderr=sproc.PIPE,
+                           encoding="utf-8")
+    except OSError as err:
+        logger.error("Command %s could not be started: %s", command, err)
+        return CommandResult(command, 127, "", str(err), 0.0, False)
+
+    try:
+        stdout, stderr = proc.communicate(input, timeout=timeout)
+    except sproc.TimeoutExpired:
+        timed_out = True
+        proc.kill()
+        stdout, stderr = proc.communicate()
+        logger.error("Command %s timed out after %s s", command, timeout)
+
+    duration = monotonic() - start
+    _record_duration(command, duration)
+
+    if proc.returncode != 0 and not timed_out:
+        logger.error("Command %s not ended successfully", command)
+    else:
+        logger.debug("Command %s ended with success", command)
+
+    return CommandResult(command, proc.returncode, stdout, stderr, duration, timed_out)
+
+
+def run_sudo(password: str, command: list, timeout: Optional[float] = DEFAULT_TIMEOUT) -> CommandResult:
+    """run_sudo Function to run command through sudo, password is passed on stdin
+
+    Args:
+        password (str): sudo password
+        command (list): command arguments without sudo prefix
+        timeout (float, optional): seconds after which command is killed
+
+    Returns:
+        CommandResult: return code, captured output and duration
+    """
+    return run(["sudo", "-S", *command], input=f"{password}\n", timeout=timeout)
+
+
+class CommandStream:
+    """CommandStream Command whose stdout is consumed line by line while it runs
+
+    Iterating yields output lines as they are produced. Once iteration ends
+    returncode, stderr, duration and timed_out are filled in.
+    """
+
+    def __init__(self, command: list, input: Optional[str] = None,
+                 timeout: Optional[float] = None, merge_stderr: bool = False):
+        self.command = command
+        self.input = input
+        self.timeout = timeout
+        self.merge_stderr = merge_stderr
+        self.returncode = None
+        self.stderr = ""
+        self.duration = 0.0
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def _kill(self, proc: sproc.Popen) -> None:
+        if proc.poll() is None:
+            self.timed_out = True
+            proc.kill()
+            logger.error("Command %s timed out after %s s", self.command, self.timeout)
+
+    def __iter__(self) -> Iterator[str]:
+        start = monotonic()
+
+        try:
+            proc = sproc.Popen(self.command,
+                               stdin=sproc.PIPE,
+                               stdout=sproc.PIPE,
+                               stderr=sproc.STDOUT if self.merge_stderr else sproc.PIPE,
+                               encoding="utf-8",
+                               bufsize=1)
+        except OSError as err:
+            logger.error("Command %s could not be started: %s", self.command, err)
+            self.returncode = 127
+            self.stderr = str(err)
+            return
+
+        stderr_chunks = []
+        stderr_thread = None
+
+        if not self.merge_stderr:
+            stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+            stderr_thread.start()
+
+        if self.input is not None:
+            try:
+                proc.stdin.write(self.input)
+            except BrokenPipeError:
+                pass
+        proc.stdin.close()
+
+        timer = None
+        if self.timeout is not None:
+            timer = threading.Timer(self.timeout, self._kill, args=(proc,))
+            timer.daemon = True
+            timer.start()
+
+        stopped = False
+
+        try:
+            for line in proc.stdout:
+                yield line.rstrip("\n")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if proc.poll() is None and not self.timed_out:
+                # Consumer stopped early
+                stopped = True
+                proc.kill()
+            proc.stdout.close()
+            self.returncode = proc.wait()
+            if stderr_thread is not None:
+                stderr_thread.join()
+                self.stderr = "".join(stderr_chunks)
+            self.duration = monotonic() - start
+            _record_duration(self.command, self.duration)
+
+            if stopped:
+                logger.debug("Command %s stopped by consumer", self.command)
+            elif self.returncode != 0 and not self.timed_out:
+                logger.error("Command %s not ended successfully", self.command)
+            else:
+                logger.debug("Command %s ended with success", self.command)
+
+
+def stream_sudo(password: str, command: list, timeout: Optional[float] = None,
+                merge_stderr: bool = False) -> CommandStream:
+    """stream_sudo Function to stream output of command run through sudo
+
+    Args:
+        password (str): sudo password
+        command (list): command arguments without sudo prefix
+        timeout (float, optional): seconds after which command is killed
+        merge_stderr (bool): interleave stderr with stdout lines
+
+    Returns:
+        CommandStream: iterable of output lines
+    """
+    return CommandStream(["sudo", "-S", *command], input=f"{password}\n",
+                         timeout=timeout, merge_stderr=merge_stderr)
@@ -0,0 +1,700 @@
+""" Background samplers keeping rolling history of system counters
+"""
+import logging
+import threading
+from collections import deque
+from time import monotonic, time
+from typing import Optional
+
+import psutil
+
+import providers
+import sensors
+from ringbuffer import RingBuffer
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_CPU_INTERVAL = 0.5
+DEFAULT_DISK_INTERVAL = 1.0
+DEFAULT_NET_INTERVAL = 1.0
+DEFAULT_TCP_INTERVAL = 5.0
+DEFAULT_THERMAL_INTERVAL = 0.25
+DEFAULT_THERMAL_HISTORY = 600.0
+THROTTLE_FREQ_RATIO = 0.85
+THROTTLE_TEMP = 80.0
+THROTTLE_MIN_DURATION = 1.0
+MAX_EPISODES = 100
+DEFAULT_HISTORY = 60.0
+WARMUP_INTERVAL = 0.1
+CPU_WINDOWS = (1, 10, 60)
+
+
+class Sampler:
+    """Sampler Base of background thread taking samples at fixed cadence
+
+    Subclasses implement sample() returning dict of series key -> row of
+    numbers matching fields. Each series is kept in RingBuffer covering
+    history seconds, series missing from samples for longer are dropped.
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+    """
+
+    name = "sampler"
+    fields = ()
+    typecode = "d"
+
+    def __init__(self, interval: float, history: float = DEFAULT_HISTORY):
+        self.interval = interval
+        self.history = history
+        self._capacity = int(history / interval) + 2
+        self._clock = RingBuffer(0, self._capacity)
+        self._series = dict()
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self) -> dict:
+        raise NotImplementedError
+
+    def _take(self) -> None:
+        try:
+            record = self.sample()
+        except Exception as err:
+            logger.error("%s sample failed: %s", self.name, err)
+            return
+
+        timestamp = monotonic()
+
+        with self._ready:
+            for key, values in record.items():
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = RingBuffer(len(self.fields), self._capacity, self.typecode)
+                series.append(timestamp, values)
+
+            for key in [key for key, series in self._series.items()
+                        if key not in record and series.timestamp(-1) < timestamp - self.history]:
+                del self._series[key]
+
+            self._clock.append(timestamp, ())
+            self._ready.notify_all()
+
+    def _loop(self) -> None:
+        self._take()
+        # First delta is available shortly after start instead of after full interval
+        if not self._stop.wait(min(WARMUP_INTERVAL, self.interval)):
+            self._take()
+
+        while not self._stop.wait(self.interval):
+            self._take()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def nbytes(self) -> int:
+        """nbytes Bytes held by ring buffers of all series
+        """
+        with self._ready:
+            return self._clock.nbytes + sum(series.nbytes for series in self._series.values())
+
+    def start(self) -> "Sampler":
+        """start Function to start sampling thread if it is not running
+
+        Returns:
+            Sampler: self
+        """
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """stop Function to stop sampling thread
+        """
+        self._stop.set()
+
+    def wait_ready(self, count: int = 2, timeout: float = 1.0) -> bool:
+        """wait_ready Function to wait until enough samples are collected
+
+        Args:
+            count (int): number of samples required
+            timeout (float): max seconds to wait
+
+        Returns:
+            bool: True if samples are available
+        """
+        with self._ready:
+            return self._ready.wait_for(lambda: len(self._clock) >= count, timeout)
+
+    def _snapshot(self, timestamp: float) -> dict:
+        ret = dict()
+
+        for key, series in self._series.items():
+            row = series.find(timestamp)
+            if row is not None:
+                ret[key] = row
+
+        return ret
+
+    def latest(self) -> Optional[tuple]:
+        """latest Function to get newest sample, waits for first one after start
+
+        Returns:
+            tuple: (timestamp, {key: row}) or None
+        """
+        self.start()
+        self.wait_ready(1)
+
+        with self._ready:
+            if not len(self._clock):
+                return None
+            timestamp = self._clock.timestamp(-1)
+            return timestamp, self._snapshot(timestamp)
+
+    def pair(self, window: float) -> Optional[tuple]:
+        """pair Function to get latest sample and sample at least window seconds older
+
+        Falls back to oldest sample if history is shorter than window.
+
+        Args:
+            window (float): seconds between samples
+
+        Returns:
+            tuple: ((old_time, {key: row}), (new_time, {key: row})) or None
+        """
+        self.start()
+        self.wait_ready()
+
+        with self._ready:
+            if len(self._clock) < 2:
+                return None
+
+            newest = self._clock.timestamp(-1)
+            target = newest - window
+            index = self._clock.bisect(target)
+            if index >= len(self._clock) or self._clock.timestamp(index) > target:
+                index -= 1
+            oldest = self._clock.timestamp(max(index, 0))
+
+            return (oldest, self._snapshot(oldest)), (newest, self._snapshot(newest))
+
+    def rows(self, window: float) -> tuple:
+        """rows Function to get history of every series over last window seconds
+
+        Args:
+            window (float): seconds of history
+
+        Returns:
+            tuple: (sample count, {key: [(timestamp, row)]})
+        """
+        self.start()
+        self.wait_ready(1)
+
+        with self._ready:
+            if not len(self._clock):
+                return 0, dict()
+
+            since = self._clock.timestamp(-1) - window
+            count = len(self._clock) - self._clock.bisect(since)
+
+            return count, {key: series.rows(since) for key, series in self._series.items()}
+
+
+def _busy_total(times) -> tuple[float, float]:
+    total = sum(times)
+    # Guest time is already accounted in user and nice on Linux
+    total -= getattr(times, "guest", 0.0) + getattr(times, "guest_nice", 0.0)
+    idle = times.idle + getattr(times, "iowait", 0.0)
+    return total - idle, total
+
+
+def _percent(busy: float, total: float) -> float:
+    if total <= 0:
+        return 0.0
+
+    return round(min(max(busy / total * 100, 0.0), 100.0), 1)
+
+
+class CpuSampler(Sampler):
+    """CpuSampler Sampler of total and per-core cpu times
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+    """
+
+    name = "cpu-sampler"
+    fields = ("busy", "total")
+
+    def __init__(self, interval: float = DEFAULT_CPU_INTERVAL, history: float = DEFAULT_HISTORY):
+        super().__init__(interval, history)
+
+    def sample(self) -> dict:
+        return {index: _busy_total(times) for index, times in enumerate(psutil.cpu_times(percpu=True))}
+
+    def usage(self, window: float = 1.0, percore: bool = False):
+        """usage Function to get cpu utilisation over window
+
+        Args:
+            window (float): seconds to average over
+            percore (bool): get utilisation per cpu core
+
+        Returns:
+            float | list: utilisation percent, list of percents if percore is set
+        """
+        pair = self.pair(window)
+
+        if pair is None:
+            return [0.0] * psutil.cpu_count() if percore else 0.0
+
+        (_, old), (_, new) = pair
+        deltas = []
+
+        for index in sorted(new):
+            if index not in old:
+                continue
+            old_busy, old_total = old[index]
+            new_busy, new_total = new[index]
+            deltas.append((new_busy - old_busy, new_total - old_total))
+
+        if percore:
+            return [_percent(busy, total) for busy, total in deltas]
+
+        return _percent(sum(busy for busy, _ in deltas), sum(total for _, total in deltas))
+
+    def usage_windows(self, percore: bool = False) -> dict:
+        """usage_windows Function to get utilisation over all standard windows
+
+        Args:
+            percore (bool): get utilisation per cpu core
+
+        Returns:
+            dict: window name, e.g. "10s" -> utilisation
+        """
+        return {f"{window}s": self.usage(window, percore) for window in CPU_WINDOWS}
+
+
+_cpu_sampler = None
+_cpu_sampler_lock = threading.Lock()
+
+
+def get_cpu_sampler(interval: float = DEFAULT_CPU_INTERVAL) -> CpuSampler:
+    """get_cpu_sampler Function to get shared running cpu sampler
+
+    Args:
+        interval (float): sampling cadence used when sampler is created
+
+    Returns:
+        CpuSampler: running sampler
+    """
+    global _cpu_sampler
+
+    with _cpu_sampler_lock:
+        if _cpu_sampler is None:
+            _cpu_sampler = CpuSampler(interval)
+        return _cpu_sampler.start()
+
+
+class DiskIoSampler(Sampler):
+    """DiskIoSampler Sampler of per device block I/O counters
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+    """
+
+    name = "disk-io-sampler"
+    fields = ("read_bytes", "write_bytes", "read_count", "write_count", "busy_time")
+
+    def __init__(self, interval: float = DEFAULT_DISK_INTERVAL, history: float = DEFAULT_HISTORY):
+        super().__init__(interval, history)
+
+    def sample(self) -> dict:
+        counters = psutil.disk_io_counters(perdisk=True, nowrap=True) or dict()
+        # busy_time is in milliseconds and only reported on Linux
+        return {device: (item.read_bytes, item.write_bytes, item.read_count, item.write_count,
+                         getattr(item, "busy_time", 0)) for device, item in counters.items()}
+
+    def rates(self, window: float = 1.0) -> dict:
+        """rates Function to get per device throughput and IOPS over window
+
+        Args:
+            window (float): seconds to average over
+
+        Returns:
+            dict: device -> read_bytes, write_bytes, read_iops, write_iops per second
+                and busy percent
+        """
+        pair = self.pair(window)
+
+        if pair is None:
+            return dict()
+
+        (old_time, old), (new_time, new) = pair
+        elapsed = new_time - old_time
+
+        if elapsed <= 0:
+            return dict()
+
+        ret = dict()
+
+        for device, counters in new.items():
+            if device not in old:
+                continue
+            read_bytes, write_bytes, read_count, write_count, busy_time = \
+                (value - previous for value, previous in zip(counters, old[device]))
+
+            ret[device] = {
+                "read_bytes": round(read_bytes / elapsed, 1),
+                "write_bytes": round(write_bytes / elapsed, 1),
+                "read_iops": round(read_count / elapsed, 1),
+                "write_iops": round(write_count / elapsed, 1),
+                "busy": _percent(busy_time, elapsed * 1000),
+            }
+
+        return ret
+
+
+_NET_FIELDS = (
+    ("rx_bytes", "bytes_recv"),
+    ("tx_bytes", "bytes_sent"),
+    ("rx_packets", "packets_recv"),
+    ("tx_packets", "packets_sent"),
+    ("rx_errors", "errin"),
+    ("tx_errors", "errout"),
+    ("rx_drops", "dropin"),
+    ("tx_drops", "dropout"),
+)
+
+
+class NetIoSampler(Sampler):
+    """NetIoSampler Sampler of per interface network counters
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+    """
+
+    name = "net-io-sampler"
+    fields = tuple(key for key, _ in _NET_FIELDS)
+
+    def __init__(self, interval: float = DEFAULT_NET_INTERVAL, history: float = DEFAULT_HISTORY):
+        super().__init__(interval, history)
+
+    def sample(self) -> dict:
+        return {interface: tuple(getattr(counters, field) for _, field in _NET_FIELDS)
+                for interface, counters in psutil.net_io_counters(pernic=True, nowrap=True).items()}
+
+    def rates(self, window: float = 1.0) -> dict:
+        """rates Function to get per interface traffic over window
+
+        Args:
+            window (float): seconds to average over
+
+        Returns:
+            dict: interface -> rx_bytes, tx_bytes, rx_packets, tx_packets, rx_errors,
+                tx_errors, rx_drops and tx_drops per second
+        """
+        pair = self.pair(window)
+
+        if pair is None:
+            return dict()
+
+        (old_time, old), (new_time, new) = pair
+        elapsed = new_time - old_time
+
+        if elapsed <= 0:
+            return dict()
+
+        ret = dict()
+
+        for interface, counters in new.items():
+            if interface not in old:
+                continue
+            ret[interface] = {
+                key: round((value - previous) / elapsed, 1)
+                for key, value, previous in zip(self.fields, counters, old[interface])
+            }
+
+        return ret
+
+
+class TcpStateSampler(Sampler):
+    """TcpStateSampler Sampler of tcp socket counts by state
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+    """
+
+    name = "tcp-state-sampler"
+    fields = tuple(providers.TCP_STATES.values())
+    typecode = "I"
+
+    def __init__(self, interval: float = DEFAULT_TCP_INTERVAL, history: float = DEFAULT_HISTORY):
+        super().__init__(interval, history)
+
+    def sample(self) -> dict:
+        states = providers.get_tcp_states()
+        return {None: tuple(states[state] for state in self.fields)}
+
+    def states(self) -> dict:
+        """states Function to get latest socket counts
+
+        Returns:
+            dict: state name -> socket count, empty if no sample was taken
+        """
+        latest = self.latest()
+
+        if latest is None or None not in latest[1]:
+            return dict()
+
+        return dict(zip(self.fields, latest[1][None]))
+
+
+class ThermalSampler(Sampler):
+    """ThermalSampler Sampler of per cpufreq policy frequency and cpu temperatures with throttling detection
+
+    Throttling episode is time when any cpufreq policy runs below freq_ratio
+    of its hardware max frequency while hottest cpu sensor is at or above
+    temp_threshold. Frequency series are kept per policy, keyed by policy
+    number, episodes list cpus of throttled policies.
+    Episodes shorter than min_duration are dropped as noise.
+
+    Args:
+        interval (float): seconds between samples
+        history (float): seconds of samples to keep
+        freq_ratio (float): fraction of max frequency considered throttled
+        temp_threshold (float): celsius considered hot
+        min_duration (float): seconds episode must last to be reported
+    """
+
+    name = "thermal-sampler"
+    fields = ("value",)
+    # Single precision is plenty for MHz and celsius and halves memory
+    typecode = "f"
+
+    def __init__(self, interval: float = DEFAULT_THERMAL_INTERVAL, history: float = DEFAULT_THERMAL_HISTORY,
+                 freq_ratio: float = THROTTLE_FREQ_RATIO, temp_threshold: float = THROTTLE_TEMP,
+                 min_duration: float = THROTTLE_MIN_DURATION):
+        super().__init__(interval, history)
+        self.freq_ratio = freq_ratio
+        self.temp_threshold = temp_threshold
+        self.min_duration = min_duration
+        self._episodes = deque(maxlen=MAX_EPISODES)
+        self._current = None
+        self._total = 0
+        self._episodes_lock = threading.Lock()
+
+    def sample(self) -> dict:
+        policies = providers.get_cpu_policies()
+        if not policies:
+            # Without cpufreq psutil reads /proc/cpuinfo, max is unknown then
+            policies = [providers.CpuPolicy(index, (index,), freq.current, 0.0)
+                        for index, freq in enumerate(psutil.cpu_freq(percpu=True))]
+        temps = sensors.get_registry().cpu()
+        cores = temps.get(sensors.CORE, [])
+        packages = temps.get(sensors.PACKAGE, [])
+
+        self._detect(policies, max(cores + packages, default=None))
+
+        ret = {("freq", policy.policy): (policy.current,) for policy in policies}
+        ret.update({("core", index): (value,) for index, value in enumerate(cores)})
+        ret.update({("package", index): (value,) for index, value in enumerate(packages)})
+
+        return ret
+
+    def _detect(self, policies: list, hottest: float) -> None:
+        # Max frequency is 0 when cpufreq is not exposed, e.g. in VMs
+        throttled = [policy for policy in policies
+                     if policy.max > 0 and policy.current < policy.max * self.freq_ratio]
+        hot = hottest is not None and hottest >= self.temp_threshold
+
+        with self._episodes_lock:
+            current = self._current
+
+            if throttled and hot:
+                lowest = min(policy.current for policy in throttled)
+                cpus = {cpu for policy in throttled for cpu in policy.cpus}
+
+                if current is None:
+                    self._current = {"start": time(), "begin": monotonic(), "min_freq": lowest,
+                                     "max_temp": hottest, "cpus": cpus}
+                else:
+                    current["min_freq"] = min(current["min_freq"], lowest)
+                    current["max_temp"] = max(current["max_temp"], hottest)
+                    current["cpus"].update(cpus)
+                return
+
+            if current is not None:
+                self._current = None
+                episode = self._episode(current, ongoing=False)
+                if episode["duration"] >= self.min_duration:
+                    self._episodes.append(episode)
+                    self._total += 1
+                    logger.warning("CPU throttled for %s s, lowest %s MHz at %s 'C",
+                                   episode["duration"], episode["min_freq"], episode["max_temp"])
+
+    @staticmethod
+    def _episode(current: dict, ongoing: bool) -> dict:
+        duration = round(monotonic() - current["begin"], 3)
+        return {
+            "start": round(current["start"], 3),
+            "end": None if ongoing else round(current["start"] + duration, 3),
+            "duration": duration,
+            "min_freq": current["min_freq"],
+            "max_temp": current["max_temp"],
+            "cpus": sorted(current["cpus"]),
+            "ongoing": ongoing,
+        }
+
+    @property
+    def throttling(self) -> bool:
+        """throttling True while episode is in progress
+        """
+        with self._episodes_lock:
+            return self._current is not None
+
+    def episodes(self, since: float = None) -> list:
+        """episodes Function to get detected throttling episodes
+
+        Args:
+            since (float, optional): unix time, only episodes ending after it
+
+        Returns:
+            list: dicts with start, end, duration, min_freq, max_temp, cpus and ongoing flag, oldest first
+        """
+        with self._episodes_lock:
+            ret = list(self._episodes)
+            if self._current is not None:
+                ret.append(self._episode(self._current, ongoing=True))
+
+        if since is not None:
+            ret = [episode for episode in ret if episode["end"] is None or episode["end"] >= since]
+
+        return ret
+
+    def episode_count(self) -> int:
+        """episode_count Function to count finished episodes since sampler was created
+        """
+        with self._episodes_lock:
+            return self._total
+
+    def summary(self, window: float = 60.0) -> dict:
+        """summary Function to aggregate frequency and temperature over window
+
+        Args:
+            window (float): seconds to aggregate
+
+        Returns:
+            dict: per cpufreq policy frequency min/avg/max in MHz, per core temperature max,
+                hottest reading, sample count and throttling flag
+        """
+        count, series = self.rows(window)
+        ret = {"samples": count, "freq": [], "temp": [], "hottest": None, "throttling": self.throttling}
+        hottest = []
+
+        for (kind, _), rows in sorted(series.items(), key=lambda item: item[0]):
+            values = [row[0] for _, row in rows]
+            if not values:
+                continue
+
+            if kind == "freq":
+                ret["freq"].append({"min": round(min(values), 1), "avg": round(sum(values) / len(values), 1),
+                                    "max": round(max(values), 1)})
+                continue
+
+            if kind == "core":
+                ret["temp"].append(round(max(values), 1))
+            hottest.append(max(values))
+
+        if hottest:
+            ret["hottest"] = round(max(hottest), 1)
+
+        return ret
+
+
+_disk_io_sampler = None
+_disk_io_sampler_lock = threading.Lock()
+
+
+def get_disk_io_sampler(interval: float = DEFAULT_DISK_INTERVAL) -> DiskIoSampler:
+    """get_disk_io_sampler Function to get shared running disk I/O sampler
+
+    Args:
+        interval (float): sampling cadence used when sampler is created
+
+    Returns:
+        DiskIoSampler: running sampler
+    """
+    global _disk_io_sampler
+
+    with _disk_io_sampler_lock:
+        if _disk_io_sampler is None:
+            _disk_io_sampler = DiskIoSampler(interval)
+        return _disk_io_sampler.start()
+
+
+_net_io_sampler = None
+_tcp_state_sampler = None
+_net_sampler_lock = threading.Lock()
+
+
+def get_net_io_sampler(interval: float = DEFAULT_NET_INTERVAL) -> NetIoSampler:
+    """get_net_io_sampler Function to get shared running network counters sampler
+
+    Args:
+        interval (float): sampling cadence used when sampler is created
+
+    Returns:
+        NetIoSampler: running sampler
+    """
+    global _net_io_sampler
+
+    with _net_sampler_lock:
+        if _net_io_sampler is None:
+            _net_io_sampler = NetIoSampler(interval)
+        return _net_io_sampler.start()
+
+
+def get_tcp_state_sampler(interval: float = DEFAULT_TCP_INTERVAL) -> TcpStateSampler:
+    """get_tcp_state_sampler Function to get shared running tcp state sampler
+
+    Args:
+        interval (float): sampling cadence used when sampler is created
+
+    Returns:
+        TcpStateSampler: running sampler
+    """
+    global _tcp_state_sampler
+
+    with _net_sampler_lock:
+        if _tcp_state_sampler is None:
+            _tcp_state_sampler = TcpStateSampler(interval)
+        return _tcp_state_sampler.start()
+
+
+_thermal_sampler = None
+_thermal_sampler_lock = threading.Lock()
+
+
+def get_thermal_sampler(interval: float = DEFAULT_THERMAL_INTERVAL) -> ThermalSampler:
+    """get_thermal_sampler Function to get shared running thermal sampler
+
+    Args:
+        interval (float): sampling cadence used when sampler is created
+
+    Returns:
+        ThermalSampler: running sampler
+    """
+    global _thermal_sampler
+
+    with _thermal_sampler_lock:
+        if _thermal_sampler is None:
+            _thermal_sampler = ThermalSampler(interval)
+        return _thermal_sampler.start()
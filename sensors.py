@@ -0,0 +1,269 @@
+""" Temperature sensor registry built from hwmon sysfs tree
+
+Chips are discovered and classified once, every later sample only reads
+temp*_input files of known sensors. Thermal zones are used when system
+exposes no hwmon temperatures, same as psutil.sensors_temperatures.
+"""
+import glob
+import logging
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_HWMON = "/sys/class/hwmon"
+DEFAULT_THERMAL = "/sys/class/thermal"
+
+CPU = "cpu"
+NVME = "nvme"
+GPU = "gpu"
+DRIVE = "drive"
+BOARD = "board"
+OTHER = "other"
+
+PACKAGE = "package"
+CORE = "core"
+
+_CPU_CHIPS = ("coretemp", "k10temp", "zenpower", "cpu_thermal", "soc_thermal", "x86_pkg_temp", "cpu-thermal")
+_GPU_CHIPS = ("amdgpu", "radeon", "nouveau", "i915", "xe")
+_BOARD_CHIPS = ("acpitz", "pch_", "nct", "it87", "asus", "dell_smm", "thinkpad", "f71", "w83")
+_PACKAGE_LABELS = ("package id", "physical id", "tctl", "tdie")
+_INPUT = re.compile(r"^temp(\d+)_input$")
+
+
+class Sensor(NamedTuple):
+    """Sensor Single temperature input of classified chip
+    """
+    chip: str
+    device: str
+    kind: str
+    label: str
+    input: str
+    role: Optional[str]
+    path: str
+
+
+def classify(chip: str) -> str:
+    """classify Function to get kind of chip from its hwmon name
+
+    Args:
+        chip (str): hwmon name, e.g. coretemp
+
+    Returns:
+        str: cpu, nvme, gpu, drive, board or other
+    """
+    name = chip.lower()
+
+    if name in _CPU_CHIPS or "cpu" in name or "core" in name:
+        return CPU
+    if name.startswith("nvme"):
+        return NVME
+    if name in _GPU_CHIPS:
+        return GPU
+    if name == "drivetemp":
+        return DRIVE
+    if name.startswith(_BOARD_CHIPS):
+        return BOARD
+
+    return OTHER
+
+
+def _role(kind: str, label: str) -> Optional[str]:
+    if kind != CPU:
+        return None
+
+    label = label.lower()
+
+    if label.startswith(_PACKAGE_LABELS) or label == "x86_pkg_temp":
+        return PACKAGE
+    if "core" in label or "k10temp" in label:
+        return CORE
+
+    return None
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def read_celsius(path: str) -> Optional[float]:
+    """read_celsius Function to read millidegree sysfs input
+
+    Args:
+        path (str): temp*_input or thermal zone temp file
+
+    Returns:
+        float: degrees Celsius, None if sensor could not be read
+    """
+    value = _read(path)
+
+    try:
+        return round(int(value) / 1000, 1)
+    except (TypeError, ValueError):
+        return None
+
+
+class SensorRegistry:
+    """SensorRegistry Discovered temperature sensors with cheap sampling
+
+    Args:
+        hwmon_root (str): hwmon class directory, fixture tree can be used in tests
+        thermal_root (str): thermal class directory used as fallback
+    """
+
+    def __init__(self, hwmon_root: str = DEFAULT_HWMON, thermal_root: str = DEFAULT_THERMAL):
+        self.hwmon_root = hwmon_root
+        self.thermal_root = thermal_root
+        self._sensors = None
+        self._lock = threading.Lock()
+
+    def _discover_hwmon(self) -> list:
+        ret = []
+
+        for device in sorted(glob.glob(os.path.join(self.hwmon_root, "hwmon*"))):
+            # Older kernels keep attributes in device subdirectory
+            base = device
+            chip = _read(os.path.join(device, "name"))
+            if chip is None:
+                base = os.path.join(device, "device")
+                chip = _read(os.path.join(base, "name"))
+            if chip is None:
+                continue
+
+            kind = classify(chip)
+            inputs = []
+
+            for name in os.listdir(base):
+                match = _INPUT.match(name)
+                if match:
+                    inputs.append(int(match.group(1)))
+
+            for index in sorted(inputs):
+                label = _read(os.path.join(base, f"temp{index}_label")) or ""
+                ret.append(Sensor(chip, os.path.basename(device), kind, label, f"temp{index}", _role(kind, label),
+                                  os.path.join(base, f"temp{index}_input")))
+
+        return ret
+
+    def _discover_thermal(self) -> list:
+        ret = []
+
+        for zone in sorted(glob.glob(os.path.join(self.thermal_root, "thermal_zone*"))):
+            chip = _read(os.path.join(zone, "type"))
+            if chip is None:
+                continue
+
+            kind = classify(chip)
+            ret.append(Sensor(chip, os.path.basename(zone), kind, "", "temp", _role(kind, chip) or (CORE if kind == CPU else None),
+                              os.path.join(zone, "temp")))
+
+        return ret
+
+    def discover(self) -> list:
+        """discover Function to scan sysfs for temperature sensors again
+
+        Returns:
+            list: discovered Sensor tuples
+        """
+        sensors = self._discover_hwmon() or self._discover_thermal()
+
+        # Cpu chips without package or core labels report core temperatures, e.g. cpu_thermal on ARM
+        for chip in {sensor.chip for sensor in sensors if sensor.kind == CPU}:
+            if not any(sensor.role for sensor in sensors if sensor.chip == chip):
+                sensors = [sensor._replace(role=CORE) if sensor.chip == chip else sensor for sensor in sensors]
+
+        with self._lock:
+            self._sensors = sensors
+
+        logger.debug("Discovered %s temperature sensors", len(sensors))
+
+        return sensors
+
+    def sensors(self, kind: str = None) -> list:
+        """sensors Function to get discovered sensors, discovery runs on first call only
+
+        Args:
+            kind (str, optional): only sensors of this chip kind
+
+        Returns:
+            list: Sensor tuples
+        """
+        with self._lock:
+            sensors = self._sensors
+
+        if sensors is None:
+            sensors = self.discover()
+
+        if kind is None:
+            return sensors
+
+        return [sensor for sensor in sensors if sensor.kind == kind]
+
+    def read(self, kind: str = None) -> list:
+        """read Function to sample sensors in one sweep
+
+        Args:
+            kind (str, optional): only sensors of this chip kind
+
+        Returns:
+            list: (Sensor, celsius) pairs, unreadable sensors are left out
+        """
+        ret = []
+
+        for sensor in self.sensors(kind):
+            value = read_celsius(sensor.path)
+            if value is not None:
+                ret.append((sensor, value))
+
+        return ret
+
+    def chips(self) -> dict:
+        """chips Function to get sensor count per chip name
+
+        Returns:
+            dict: chip name -> number of temperature inputs
+        """
+        ret = dict()
+
+        for sensor in self.sensors():
+            ret[sensor.chip] = ret.get(sensor.chip, 0) + 1
+
+        return ret
+
+    def cpu(self) -> dict:
+        """cpu Function to sample cpu package and core temperatures
+
+        Returns:
+            dict: "package" and "core" lists of celsius values, empty lists are left out
+        """
+        ret = dict()
+
+        for sensor, value in self.read(CPU):
+            if sensor.role is not None:
+                ret.setdefault(sensor.role, []).append(value)
+
+        return ret
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SensorRegistry:
+    """get_registry Function to get shared registry of system sensors
+
+    Returns:
+        SensorRegistry: registry
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = SensorRegistry()
+        return _registry
@@ -0,0 +1,371 @@
+""" Streaming container stats feed with rolling aggregates
+
+One long-lived stats stream per subscribed container fills ring buffers,
+aggregates over any window up to history are answered from memory.
+Without Engine API all containers share one docker stats process.
+Streams nobody read for IDLE_TIMEOUT seconds and streams of removed
+containers are closed.
+"""
+import json
+import logging
+import math
+import re
+import threading
+from time import monotonic
+from typing import Optional
+from urllib.parse import quote
+
+import dockerapi
+import runner
+from ringbuffer import RingBuffer
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_HISTORY = 300
+DEFAULT_WINDOW = 60.0
+RETRY_DELAY = 5.0
+IDLE_TIMEOUT = 300.0
+METRICS = ("cpu", "mem", "net_rx", "net_tx", "block_read", "block_write")
+
+_SIZE_UNITS = {
+    "b": 1, "kb": 1e3, "mb": 1e6, "gb": 1e9, "tb": 1e12,
+    "kib": 2 ** 10, "mib": 2 ** 20, "gib": 2 ** 30, "tib": 2 ** 40,
+}
+_SIZE = re.compile(r"([\d.]+)\s*([a-zA-Z]*)")
+
+
+def _parse_size(text: str) -> float:
+    match = _SIZE.match(text.strip())
+    if not match:
+        return 0.0
+    return float(match.group(1)) * _SIZE_UNITS.get(match.group(2).lower(), 1)
+
+
+def _parse_cli_line(line: str) -> Optional[dict]:
+    """_parse_cli_line Function to parse docker stats --format "{{json .}}" line to parse_stats shape
+
+    Args:
+        line (str): output line, may start with terminal control sequences
+
+    Returns:
+        dict: raw numbers, None if line holds no stats
+    """
+    start = line.find("{")
+    if start == -1:
+        return None
+
+    try:
+        row = json.loads(line[start:])
+    except ValueError:
+        return None
+
+    mem = row.get("MemUsage", "0B / 0B").split("/")
+    net = row.get("NetIO", "0B / 0B").split("/")
+    block = row.get("BlockIO", "0B / 0B").split("/")
+
+    return {
+        "name": row.get("Name", ""),
+        "cpu": float(row.get("CPUPerc", "0%").rstrip("%") or 0),
+        "mem_used": _parse_size(mem[0]),
+        "mem_limit": _parse_size(mem[-1]),
+        "net_rx": _parse_size(net[0]),
+        "net_tx": _parse_size(net[-1]),
+        "block_read": _parse_size(block[0]),
+        "block_write": _parse_size(block[-1]),
+    }
+
+
+def _percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class _ContainerStream:
+
+    def __init__(self, name: str, history: int, cli: bool = False):
+        self.name = name
+        self.cli = cli
+        # Row per sample in METRICS order, rates are NaN until second sample
+        self.samples = RingBuffer(len(METRICS), history)
+        self.previous = None
+        self.error = None
+        self.read = monotonic()
+        self.stop = threading.Event()
+        self.connection = None
+        self.lock = threading.Lock()
+
+    @property
+    def idle(self) -> bool:
+        return monotonic() - self.read > IDLE_TIMEOUT
+
+    def add(self, parsed: dict) -> None:
+        now = monotonic()
+        rates = (math.nan,) * 4
+
+        if self.previous is not None and now > self.previous[0]:
+            elapsed = now - self.previous[0]
+            # Counters reset when container restarts
+            rates = tuple(max(parsed[key] - self.previous[1][key], 0) / elapsed
+                          for key in ("net_rx", "net_tx", "block_read", "block_write"))
+
+        self.previous = (now, parsed)
+
+        with self.lock:
+            self.samples.append(now, (parsed["cpu"], parsed["mem_used"], *rates))
+        self.error = None
+
+
+class StatsFeed:
+    """StatsFeed Keeps stats streams of subscribed containers
+
+    Uses Docker Engine API when socket is usable, else one long running
+    docker stats through sudo for all containers.
+
+    Args:
+        client (DockerClient, optional): Engine API client, shared one by default
+        history (int): samples kept per container, docker sends one per second
+    """
+
+    def __init__(self, client: Optional[dockerapi.DockerClient] = None, history: int = DEFAULT_HISTORY):
+        self.client = client
+        self.history = history
+        self._streams = dict()
+        self._lock = threading.Lock()
+        self._password = ""
+        self._cli_thread = None
+        self._cli_changed = threading.Event()
+
+    def _follow_api(self, stream: _ContainerStream) -> None:
+        client = self.client or dockerapi.get_client()
+        connection = client.connect(timeout=RETRY_DELAY * 6)
+        stream.connection = connection
+
+        try:
+            connection.request("GET", f"/containers/{quote(stream.name)}/stats?stream=1")
+            response = connection.getresponse()
+
+            if response.status >= 400:
+                raise dockerapi.DockerError(response.status, response.read().decode("utf-8", "replace"))
+
+            while not stream.stop.is_set() and not stream.idle:
+                line = response.readline()
+                if not line:
+                    break
+                if line.strip():
+                    stream.add(dockerapi.parse_stats(json.loads(line)))
+        finally:
+            connection.close()
+
+    def _run_api(self, stream: _ContainerStream) -> None:
+        while not stream.stop.is_set():
+            if stream.idle:
+                logger.info("Stats stream of %s not read for %s s, closing", stream.name, IDLE_TIMEOUT)
+                self.unsubscribe([stream.name])
+                return
+
+            try:
+                self._follow_api(stream)
+            except dockerapi.DockerError as err:
+                if err.status == 404:
+                    logger.warning("Container %s no longer exists, closing stats stream", stream.name)
+                    self.unsubscribe([stream.name])
+                    return
+                stream.error = str(err)
+                logger.error("Stats stream of %s failed: %s", stream.name, err)
+            except Exception as err:
+                if not stream.stop.is_set():
+                    stream.error = str(err)
+                    logger.error("Stats stream of %s failed: %s", stream.name, err)
+
+            stream.stop.wait(RETRY_DELAY)
+
+    def _run_cli(self) -> None:
+        while True:
+            with self._lock:
+                names = sorted(name for name, stream in self._streams.items() if stream.cli)
+                if not names:
+                    self._cli_thread = None
+                    return
+                self._cli_changed.clear()
+                password = self._password
+
+            command = runner.stream_sudo(password, ["docker", "stats", "--format", "{{json .}}", *names])
+
+            for line in command:
+                if self._cli_changed.is_set():
+                    break
+                parsed = _parse_cli_line(line)
+                stream = self._streams.get(parsed["name"]) if parsed is not None else None
+                if stream is not None and stream.cli:
+                    stream.add(parsed)
+                self._expire()
+
+            if self._cli_changed.is_set():
+                # Stream set changed, restart docker stats with new names
+                continue
+
+            absent = [name for name in dockerapi.NO_SUCH_CONTAINER.findall(command.stderr) if name in names]
+            if absent:
+                logger.warning("Containers %s no longer exist, closing their stats streams", absent)
+                self.unsubscribe(absent)
+                continue
+
+            error = command.stderr.strip() or f"docker stats ended with code {command.returncode}"
+            logger.error("Stats stream of %s failed: %s", names, error)
+            with self._lock:
+                for name in names:
+                    if name in self._streams:
+                        self._streams[name].error = error
+
+            self._cli_changed.wait(RETRY_DELAY)
+
+    def _expire(self) -> None:
+        with self._lock:
+            idle = [name for name, stream in self._streams.items() if stream.idle]
+
+        if idle:
+            logger.info("Stats streams of %s not read for %s s, closing", idle, IDLE_TIMEOUT)
+            self.unsubscribe(idle)
+
+    def subscribe(self, containers: list, password: str = "") -> None:
+        """subscribe Function to start streaming stats of containers not followed yet
+
+        Args:
+            containers (list): container names
+            password (str): sudo password, used when docker socket is not usable
+        """
+        self._expire()
+        client = self.client or dockerapi.get_client()
+        api = client.is_available()
+
+        with self._lock:
+            added = False
+
+            for name in containers:
+                if name in self._streams:
+                    self._streams[name].read = monotonic()
+                    continue
+
+                stream = _ContainerStream(name, self.history, cli=not api)
+                self._streams[name] = stream
+                added = True
+
+                if api:
+                    threading.Thread(target=self._run_api, args=(stream,), name=f"stats-{name}", daemon=True).start()
+
+            if added and not api:
+                self._password = password
+                self._cli_changed.set()
+                if self._cli_thread is None:
+                    self._cli_thread = threading.Thread(target=self._run_cli, name="stats-cli", daemon=True)
+                    self._cli_thread.start()
+
+    def unsubscribe(self, containers: Optional[list] = None) -> None:
+        """unsubscribe Function to stop streaming stats
+
+        Args:
+            containers (list, optional): container names, all if not given
+        """
+        with self._lock:
+            names = list(self._streams) if containers is None else containers
+            for name in names:
+                stream = self._streams.pop(name, None)
+                if stream is None:
+                    continue
+                stream.stop.set()
+                if stream.cli:
+                    self._cli_changed.set()
+                if stream.connection is not None:
+                    stream.connection.close()
+
+    def latest(self, containers: Optional[list] = None) -> dict:
+        """latest Function to get newest sample of each container
+
+        Args:
+            containers (list, optional): container names, all subscribed if not given
+
+        Returns:
+            dict: container -> {"age": seconds since sample or None, "error": str or None,
+                metric: value}, rates are per second, metrics are None before first sample
+        """
+        ret = dict()
+        now = monotonic()
+
+        with self._lock:
+            streams = [self._streams[name] for name in (containers or list(self._streams)) if name in self._streams]
+            for stream in streams:
+                stream.read = now
+
+        for stream in streams:
+            with stream.lock:
+                stamp = stream.samples.timestamp(-1) if len(stream.samples) else None
+                row = stream.samples.row(-1) if stamp is not None else (math.nan,) * len(METRICS)
+
+            entry = {"age": round(now - stamp, 3) if stamp is not None else None, "error": stream.error}
+            for metric, value in zip(METRICS, row):
+                entry[metric] = round(value, 2) if not math.isnan(value) else None
+
+            ret[stream.name] = entry
+
+        return ret
+
+    def aggregate(self, containers: Optional[list] = None, window: float = DEFAULT_WINDOW) -> dict:
+        """aggregate Function to get min, avg, max and p95 of each metric over window
+
+        Args:
+            containers (list, optional): container names, all subscribed if not given
+            window (float): seconds to aggregate over
+
+        Returns:
+            dict: container -> {"samples": count, "error": str or None,
+                metric: {"min", "avg", "max", "p95"}}, rates are per second
+        """
+        ret = dict()
+        now = monotonic()
+
+        with self._lock:
+            streams = [self._streams[name] for name in (containers or list(self._streams)) if name in self._streams]
+            for stream in streams:
+                stream.read = now
+
+        for stream in streams:
+            with stream.lock:
+                count = len(stream.samples) - stream.samples.bisect(now - window)
+                columns = [stream.samples.column(field, now - window) for field in range(len(METRICS))]
+
+            entry = {"samples": count, "error": stream.error}
+
+            for metric, column in zip(METRICS, columns):
+                values = [value for value in column if not math.isnan(value)]
+                if not values:
+                    entry[metric] = None
+                    continue
+                entry[metric] = {
+                    "min": round(min(values), 2),
+                    "avg": round(sum(values) / len(values), 2),
+                    "max": round(max(values), 2),
+                    "p95": round(_percentile(values, 95), 2),
+                }
+
+            ret[stream.name] = entry
+
+        return ret
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed() -> StatsFeed:
+    """get_feed Function to get shared stats feed
+
+    Returns:
+        StatsFeed: feed kept for process lifetime
+    """
+    global _feed
+
+    with _feed_lock:
+        if _feed is None:
+            _feed = StatsFeed()
+        return _feed
@@ -0,0 +1,345 @@
+""" Embedded append-only time-series store with downsampling tiers
+
+Each metric has one file per tier holding fixed size little endian double
+records, so files are appended to without parsing and range queries binary
+search over memory mapped data. Raw tier stores (timestamp, value), rollup
+tiers store (bucket start, min, avg, max).
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from time import time
+from typing import Optional
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_DIRECTORY = os.environ.get("COPILOT_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"))
+DEFAULT_RECORD_INTERVAL = 10.0
+COMPACT_EVERY = 1000
+
+RAW = "raw"
+MINUTE = "1m"
+HOUR = "1h"
+
+# tier -> (bucket seconds, retention seconds)
+TIERS = {
+    RAW: (0, 24 * 3600),
+    MINUTE: (60, 7 * 24 * 3600),
+    HOUR: (3600, 365 * 24 * 3600),
+}
+
+_RAW_RECORD = struct.Struct("<dd")
+_ROLLUP_RECORD = struct.Struct("<dddd")
+_METRIC_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw]?)$")
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(text: str) -> float:
+    """parse_duration Function to parse duration like 90, 15m, 6h or 7d
+
+    Args:
+        text (str): duration
+
+    Raises:
+        ValueError: text is not duration
+
+    Returns:
+        float: seconds
+    """
+    match = _DURATION.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {text}")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+class _Rollup:
+
+    __slots__ = ("start", "min", "max", "total", "count")
+
+    def __init__(self, start: float, value: float):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.total = value
+        self.count = 1
+
+    def add(self, value: float) -> None:
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.total += value
+        self.count += 1
+
+    def record(self) -> bytes:
+        return _ROLLUP_RECORD.pack(self.start, self.min, self.total / self.count, self.max)
+
+
+class TimeSeriesStore:
+    """TimeSeriesStore On-disk store of numeric samples per metric
+
+    Args:
+        directory (str): directory holding metric files, created if missing
+        tiers (dict): tier -> (bucket seconds, retention seconds)
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, tiers: dict = TIERS):
+        self.directory = directory
+        self.tiers = tiers
+        self._rollups = dict()
+        self._appends = dict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, metric: str, tier: str) -> str:
+        return os.path.join(self.directory, f"{metric}.{tier}.bin")
+
+    def _record_struct(self, tier: str) -> struct.Struct:
+        return _RAW_RECORD if self.tiers[tier][0] == 0 else _ROLLUP_RECORD
+
+    def _write(self, metric: str, tier: str, data: bytes) -> None:
+        with open(self._path(metric, tier), "ab") as file:
+            file.write(data)
+
+        key = (metric, tier)
+        self._appends[key] = self._appends.get(key, 0) + 1
+
+        if self._appends[key] >= COMPACT_EVERY:
+            self._appends[key] = 0
+            self._compact(metric, tier)
+
+    def _compact(self, metric: str, tier: str) -> None:
+        """_compact Function to drop records older than tier retention
+        """
+        path = self._path(metric, tier)
+        record = self._record_struct(tier)
+        cutoff = time() - self.tiers[tier][1]
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        index = self._bisect(data, record, cutoff)
+
+        if index == 0:
+            return
+
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data[index * record.size:])
+        os.replace(temporary, path)
+
+        logger.debug("Compacted %s, dropped %s records", path, index)
+
+    def append(self, metric: str, value: float, timestamp: Optional[float] = None) -> None:
+        """append Function to store sample and feed rollup tiers
+
+        Args:
+            metric (str): metric name, letters, digits, _ . and -
+            value (float): sample value
+            timestamp (float, optional): unix time, now if not given
+        """
+        if not _METRIC_NAME.match(metric):
+            raise ValueError(f"Invalid metric name: {metric}")
+
+        timestamp = time() if timestamp is None else timestamp
+        value = float(value)
+
+        with self._lock:
+            for tier, (bucket, _) in self.tiers.items():
+                if bucket == 0:
+                    self._write(metric, tier, _RAW_RECORD.pack(timestamp, value))
+                    continue
+
+                start = timestamp - timestamp % bucket
+                rollup = self._rollups.get((metric, tier))
+
+                if rollup is None:
+                    rollup = self._resume(metric, tier, start, timestamp)
+
+                if rollup is not None and rollup.start == start:
+                    rollup.add(value)
+                    self._rollups[(metric, tier)] = rollup
+                    continue
+
+                if rollup is not None:
+                    self._write(metric, tier, rollup.record())
+
+                self._rollups[(metric, tier)] = _Rollup(start, value)
+
+    def _resume(self, metric: str, tier: str, start: float, timestamp: float) -> Optional[_Rollup]:
+        """_resume Function to continue bucket flushed unfinished by previous process
+
+        Flushed record is removed from file and bucket is rebuilt from raw
+        samples, so restart inside bucket does not leave duplicate record.
+
+        Returns:
+            _Rollup: bucket starting at start, None if file does not end with it
+        """
+        path = self._path(metric, tier)
+        record = self._record_struct(tier)
+
+        try:
+            size = os.path.getsize(path)
+            with open(path, "rb") as file:
+                file.seek(size - size % record.size - record.size)
+                last = record.unpack(file.read(record.size))
+        except (OSError, ValueError, struct.error):
+            return None
+
+        if last[0] != start:
+            return None
+
+        os.truncate(path, size - size % record.size - record.size)
+
+        raw = [name for name, (bucket, _) in self.tiers.items() if bucket == 0]
+        values = [item[1] for item in self.query(metric, start, timestamp, raw[0]) if item[0] < timestamp] if raw else []
+
+        if not values:
+            # Without raw samples flushed aggregates are kept as single sample
+            rollup = _Rollup(start, last[2])
+            rollup.min, rollup.max = last[1], last[3]
+            return rollup
+
+        rollup = _Rollup(start, values[0])
+        for item in values[1:]:
+            rollup.add(item)
+
+        return rollup
+
+    def flush(self) -> None:
+        """flush Function to write unfinished rollup buckets, e.g. before exit
+        """
+        with self._lock:
+            for (metric, tier), rollup in self._rollups.items():
+                self._write(metric, tier, rollup.record())
+            self._rollups.clear()
+
+    def metrics(self) -> list:
+        """metrics Function to list stored metric names
+
+        Returns:
+            list: metric names
+        """
+        names = set()
+
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                names.add(name.rsplit(".", 2)[0])
+
+        return sorted(names)
+
+    @staticmethod
+    def _bisect(data, record: struct.Struct, timestamp: float) -> int:
+        low, high = 0, len(data) // record.size
+
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from("<d", data, middle * record.size)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def pick_tier(self, start: float) -> str:
+        """pick_tier Function to choose finest tier whose retention covers start
+
+        Args:
+            start (float): unix time of range start
+
+        Returns:
+            str: tier name
+        """
+        age = time() - start
+        tiers = sorted(self.tiers, key=lambda tier: self.tiers[tier][0])
+
+        for tier in tiers:
+            if age <= self.tiers[tier][1]:
+                return tier
+
+        return tiers[-1]
+
+    def query(self, metric: str, start: float, end: Optional[float] = None, tier: Optional[str] = None) -> list:
+        """query Function to read samples in time range
+
+        Args:
+            metric (str): metric name
+            start (float): unix time of range start
+            end (float, optional): unix time of range end, now if not given
+            tier (str, optional): tier name, finest one covering range if not given
+
+        Returns:
+            list: (timestamp, value) for raw tier, (timestamp, min, avg, max) for rollups
+        """
+        if not _METRIC_NAME.match(metric):
+            raise ValueError(f"Invalid metric name: {metric}")
+
+        end = time() if end is None else end
+        tier = tier or self.pick_tier(start)
+        record = self._record_struct(tier)
+        path = self._path(metric, tier)
+        ret = []
+
+        if not os.path.exists(path) or os.path.getsize(path) < record.size:
+            return ret
+
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            count = len(data) // record.size
+            index = self._bisect(data, record, start)
+
+            while index < count:
+                item = record.unpack_from(data, index * record.size)
+                if item[0] > end:
+                    break
+                ret.append(item)
+                index += 1
+
+        return ret
+
+
+class Recorder:
+    """Recorder Background loop appending collector values to store
+
+    Args:
+        store (TimeSeriesStore): destination store
+        sources (dict): metric name -> callable returning number or None
+        interval (float): seconds between samples
+    """
+
+    def __init__(self, store: TimeSeriesStore, sources: dict, interval: float = DEFAULT_RECORD_INTERVAL):
+        self.store = store
+        self.sources = sources
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record_once(self) -> None:
+        timestamp = time()
+
+        for metric, source in self.sources.items():
+            try:
+                value = source()
+            except Exception as err:
+                logger.error("Recording %s failed: %s", metric, err)
+                continue
+
+            if value is not None:
+                self.store.append(metric, value, timestamp)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.record_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> "Recorder":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="tsdb-recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.store.flush()
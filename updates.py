@@ -0,0 +1,335 @@
+""" Apt update checker with cached results and single-flight refresh
+
+Parsed upgradable list is kept in JSON cache file so every process answers
+update checks from it. Only one apt run happens at a time, in-process
+callers wait for running check and other processes wait on lock file, then
+reuse its result.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+from time import time
+from typing import Iterator, Optional
+
+import runner
+
+logger = logging.getLogger('copilotLogger')
+
+DEFAULT_CACHE = os.environ.get("COPILOT_UPDATES_CACHE",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "updates.json"))
+DEFAULT_APT = os.environ.get("COPILOT_APT", "apt")
+DEFAULT_MAX_AGE = 6 * 3600
+APT_UPDATE_TIMEOUT = 300
+APT_LIST_TIMEOUT = 60
+APT_UPGRADE_TIMEOUT = 3600
+
+
+def parse_upgradable(output: str) -> list:
+    """parse_upgradable Function to parse apt list --upgradable output
+
+    Args:
+        output (str): command output, first line is "Listing..."
+
+    Returns:
+        list: "package: old -> new" strings
+    """
+    ret = []
+
+    for line in output.splitlines()[1::]:
+        line_split = line.strip().split(" ")
+        if len(line_split) < 2:
+            continue
+        ret.append(line_split[0] + ": " + line_split[-1][0:-1:] + " -> " + line_split[1])
+
+    return ret
+
+
+_UPGRADE_SUMMARY = re.compile(r"^(\d+) upgraded, (\d+) newly installed, (\d+) to remove and (\d+) not upgraded")
+_PACKAGE_STEP = re.compile(r"^(Unpacking|Setting up) (\S+) \(([^)]+)\)")
+_FETCHED = re.compile(r"^Fetched ([\d,.]+) ([kMG]?B) in")
+_SIZE_UNITS = {"B": 1, "kB": 1e3, "MB": 1e6, "GB": 1e9}
+
+
+def _parse_fetched(line: str) -> Optional[int]:
+    match = _FETCHED.match(line)
+    if not match:
+        return None
+    return int(float(match.group(1).replace(",", "")) * _SIZE_UNITS[match.group(2)])
+
+
+def stream_upgrade(password: str, apt: str = DEFAULT_APT, timeout: Optional[float] = APT_UPGRADE_TIMEOUT) -> Iterator[dict]:
+    """stream_upgrade Function to run apt upgrade yielding progress events as they happen
+
+    Events have "event" key: "unpacking" and "setting_up" with package and
+    version, "error" with message, and final "summary" with upgraded,
+    newly_installed, removed, not_upgraded, held_back, download_bytes,
+    duration, returncode and ok.
+
+    Args:
+        password (str): sudo password
+        apt (str): apt binary
+        timeout (float, optional): seconds after which apt is killed
+
+    Yields:
+        dict: progress event
+    """
+    stream = runner.stream_sudo(password, [apt, "upgrade", "-y"], timeout=timeout, merge_stderr=True)
+    summary = {
+        "event": "summary",
+        "upgraded": 0,
+        "newly_installed": 0,
+        "removed": 0,
+        "not_upgraded": 0,
+        "held_back": [],
+        "download_bytes": 0,
+    }
+    in_held_back = False
+
+    for line in stream:
+        if in_held_back:
+            if line.startswith(" "):
+                summary["held_back"].extend(line.split())
+                continue
+            in_held_back = False
+
+        if line.startswith("The following packages have been kept back"):
+            in_held_back = True
+            continue
+
+        match = _PACKAGE_STEP.match(line)
+        if match:
+            yield {
+                "event": "unpacking" if match.group(1) == "Unpacking" else "setting_up",
+                "package": match.group(2),
+                "version": match.group(3),
+            }
+            continue
+
+        match = _UPGRADE_SUMMARY.match(line)
+        if match:
+            summary["upgraded"], summary["newly_installed"], summary["removed"], summary["not_upgraded"] = \
+                (int(group) for group in match.groups())
+            continue
+
+        fetched = _parse_fetched(line)
+        if fetched is not None:
+            summary["download_bytes"] = fetched
+            continue
+
+        if line.startswith("E: ") or line.startswith("dpkg: error"):
+            yield {"event": "error", "message": line}
+
+    summary["duration"] = round(stream.duration, 3)
+    summary["returncode"] = stream.returncode
+    summary["ok"] = stream.ok
+
+    if not stream.ok:
+        logger.error("Upgrade ended with code %s", stream.returncode)
+
+    yield summary
+
+
+class UpdateChecker:
+    """UpdateChecker Cached apt update check with background refresh
+
+    Args:
+        cache_path (str): JSON cache file, lock file is created next to it
+        max_age (float): seconds after which cached result is refreshed
+        apt (str): apt binary, absolute path of stub can be used in tests
+    """
+
+    def __init__(self, cache_path: str = DEFAULT_CACHE, max_age: float = DEFAULT_MAX_AGE, apt: str = DEFAULT_APT):
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.apt = apt
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._result = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._password = None
+
+    def cached(self) -> Optional[dict]:
+        """cached Function to read cached check result
+
+        Returns:
+            dict: updates list and checked unix time, None if nothing is cached
+        """
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or "updates" not in data or "checked" not in data:
+            return None
+
+        return data
+
+    def _store(self, updates: list) -> dict:
+        data = {"updates": updates, "checked": time()}
+        temporary = self.cache_path + ".tmp"
+
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temporary, self.cache_path)
+
+        return data
+
+    def invalidate(self) -> None:
+        """invalidate Function to drop cached result, e.g. after upgrade
+        """
+        try:
+            os.unlink(self.cache_path)
+        except FileNotFoundError:
+            pass
+
+    def _check(self, password: str, started: float) -> Optional[dict]:
+        with open(self.cache_path + ".lock", "w") as lock_file:
+            # Another process may be running apt, wait for it and reuse its result
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                data = self.cached()
+                if data is not None and data["checked"] >= started:
+                    return data
+
+                result = runner.run_sudo(password, [self.apt, "update"], timeout=APT_UPDATE_TIMEOUT)
+                if not result.ok:
+                    return None
+
+                result = runner.run([self.apt, "list", "--upgradable"], timeout=APT_LIST_TIMEOUT)
+                if not result.ok:
+                    return None
+
+                data = self._store(parse_upgradable(result.stdout))
+                logger.debug("Update list: %s", data["updates"])
+                return data
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self, password: str) -> Optional[dict]:
+        """refresh Function to run apt check, concurrent callers share one run
+
+        Args:
+            password (str): sudo password
+
+        Returns:
+            dict: updates list and checked unix time, None if apt failed
+        """
+        with self._lock:
+            if self._inflight is not None:
+                event = self._inflight
+                leader = False
+            else:
+                event = self._inflight = threading.Event()
+                leader = True
+
+        if not leader:
+            event.wait()
+            return self._result
+
+        try:
+            self._result = self._check(password, time())
+        except Exception as err:
+            logger.error("Update check failed: %s", err)
+            self._result = None
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+
+        return self._result
+
+    def refresh_async(self, password: str) -> None:
+        """refresh_async Function to start refresh in background unless one is running
+
+        Args:
+            password (str): sudo password
+        """
+        with self._lock:
+            if self._inflight is not None:
+                return
+
+        threading.Thread(target=self.refresh, args=(password,), name="update-check", daemon=True).start()
+
+    def check(self, password: str, background: bool = False) -> Optional[dict]:
+        """check Function to answer update check from cache
+
+        Cached result older than max_age is refreshed, in background if
+        requested and cached result exists, else before returning.
+
+        Args:
+            password (str): sudo password
+            background (bool): return stale cached result while refreshing
+
+        Returns:
+            dict: updates, checked unix time, age seconds and stale flag, None if apt failed
+        """
+        data = self.cached()
+        stale = data is None or time() - data["checked"] > self.max_age
+
+        if stale:
+            if background and data is not None:
+                self.refresh_async(password)
+            else:
+                data = self.refresh(password)
+                stale = False
+
+        if data is None:
+            return None
+
+        return dict(data, age=round(time() - data["checked"], 1), stale=stale)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            data = self.cached()
+            age = time() - data["checked"] if data is not None else self.max_age
+            wait = self.max_age - age
+
+            if wait <= 0:
+                self.refresh(self._password)
+                wait = self.max_age
+
+            self._stop.wait(wait)
+
+    def start(self, password: str) -> "UpdateChecker":
+        """start Function to start scheduled refresh in background
+
+        Args:
+            password (str): sudo password kept in memory for scheduled runs, replaces
+                password of earlier calls so changed password is picked up by running loop
+
+        Returns:
+            UpdateChecker: self
+        """
+        self._password = password
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="update-schedule", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def get_checker() -> UpdateChecker:
+    """get_checker Function to get shared update checker
+
+    Returns:
+        UpdateChecker: checker using default cache file
+    """
+    global _checker
+
+    with _checker_lock:
+        if _checker is None:
+            _checker = UpdateChecker()
+        return _checker
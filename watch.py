@@ -0,0 +1,85 @@
+""" Watch mode repeating query at fixed cadence in one long running process
+
+Kept free of psutil so watching through daemon stays a thin client.
+"""
+from time import monotonic, sleep
+from typing import Callable
+
+DEFAULT_INTERVAL = 2.0
+
+
+def delta(previous, current):
+    """delta Function to get part of result that changed since previous one
+
+    Dicts are compared key by key recursively, other values as whole.
+    Keys that disappeared are reported with None value.
+
+    Args:
+        previous (Any): previous result
+        current (Any): current result
+
+    Returns:
+        Any: changed part, empty dict if nothing changed
+    """
+    if not isinstance(previous, dict) or not isinstance(current, dict):
+        return {} if previous == current else current
+
+    ret = dict()
+
+    for key, value in current.items():
+        if key not in previous:
+            ret[key] = value
+        elif isinstance(value, dict) and isinstance(previous[key], dict):
+            changed = delta(previous[key], value)
+            if changed:
+                ret[key] = changed
+        elif previous[key] != value:
+            ret[key] = value
+
+    for key in previous:
+        if key not in current:
+            ret[key] = None
+
+    return ret
+
+
+def run(fetch: Callable, write: Callable, interval: float = DEFAULT_INTERVAL, changes: bool = False,
+        count: int = None) -> None:
+    """run Function to fetch and write result every interval seconds until interrupted or output is closed
+
+    Ticks are scheduled from start time so slow fetches do not shift the
+    cadence, ticks missed by slow fetch are skipped.
+
+    Args:
+        fetch (Callable): returns current result
+        write (Callable): outputs one result
+        interval (float): seconds between ticks
+        changes (bool): after first full result write only changed fields, nothing if no field changed
+        count (int, optional): number of ticks, unlimited if not given
+    """
+    previous = None
+    tick = 0
+    start = monotonic()
+
+    try:
+        while count is None or tick < count:
+            current = fetch()
+
+            if not changes or previous is None:
+                write(current)
+            else:
+                changed = delta(previous, current)
+                if changed:
+                    write(changed)
+
+            previous = current
+            tick += 1
+
+            elapsed = monotonic() - start
+            if elapsed > tick * interval:
+                # Skip ticks that passed while fetching
+                tick = int(elapsed // interval) + 1
+            sleep(max(start + tick * interval - monotonic(), 0))
+    except (KeyboardInterrupt, BrokenPipeError):
+        # Reader went away, e.g. piped into head
+        pass